@@ -1,61 +1,634 @@
 import io
 import logging
+import os
+import wave
 
+import numpy as np
 from pydub import AudioSegment
 
+from audio.bgm import BgmBed
+from audio.encoder import SegmentedMp3Encoder, StreamingMp3Encoder, transcode_renditions
+from audio.mp3frames import (
+    ENCODER_DELAY,
+    STREAM_DELAY,
+    StreamFormat,
+    encode_part,
+    id3v2_size,
+    id3v2_tag,
+    parse_frames,
+    silent_frame,
+    xing_frame,
+)
+from audio.loudness import normalize
+from config import (
+    AUDIO_ASSEMBLY_MODE,
+    AUDIO_LOUDNESS_NORMALIZE,
+    AUDIO_LOUDNESS_TARGET_LUFS,
+    TTS_PCM_SAMPLE_RATE,
+)
+
 logger = logging.getLogger(__name__)
 
+# Frames mixed and handed to the encoder at a time once a story is assembled
+_ENCODE_BLOCK_FRAMES = 1 << 16
+
 
-def assemble_audio(segments: list[dict], output_path: str, tags: dict | None = None) -> float:
+def assemble_audio(
+    segments: list[dict],
+    output_path: str,
+    tags: dict | None = None,
+    bgm_path: str | None = None,
+    renditions: dict[str, str] | None = None,
+    index: dict | None = None,
+) -> float:
     """Concatenate synthesized audio segments with pauses into a single MP3.
 
     Args:
-        segments: List of dicts with "audio_bytes" (MP3 bytes) and "pause_after_ms".
+        segments: List of dicts with "pause_after_ms", "format" and either
+            "audio_path" (file on disk) or "audio_bytes" (in-memory audio);
+            an optional "title" names the segment's ID3 chapter.
         output_path: Path to write the final MP3 file.
         tags: Optional ID3 metadata tags (e.g. title, artist, album).
+        bgm_path: Optional background music, looped, faded and mixed under
+            the narration samples before the single encode.
+        renditions: Optional extra encodings to write, mapping a name from
+            audio.encoder.RENDITIONS to its output path. They are encoded
+            from the same PCM, by the same ffmpeg process, as the MP3.
+        index: Optional dict filled in place with the segment index of the
+            MP3 (see _finish_master), for splice_segments and seeking.
+
+    With AUDIO_ASSEMBLY_MODE = "stream" the MP3 is encoded progressively and
+    only one segment is decoded at a time. With "frames", MP3 segments are
+    joined frame by frame without re-encoding (see audio.mp3frames) and only
+    segments in another format are encoded; renditions are then transcoded
+    from the joined MP3. Otherwise the story is built in one PCM buffer and
+    then encoded. Every segment becomes an ID3 chapter.
+
+    With AUDIO_LOUDNESS_NORMALIZE, each decoded segment is scaled to
+    AUDIO_LOUDNESS_TARGET_LUFS as it is written (see audio.loudness); in
+    "frames" mode segments are joined undecoded and keep their level.
 
     Returns:
         Duration in seconds.
     """
-    combined = None
+    if segments and AUDIO_ASSEMBLY_MODE == "stream":
+        spans, rate = _assemble_streaming(segments, output_path, tags, bgm_path, renditions)
+        duration_seconds = _finish_master(output_path, segments, spans, rate, STREAM_DELAY, tags, index)
+        logger.info("Assembled audio (streamed): %.1f seconds -> %s", duration_seconds, output_path)
+        return duration_seconds
 
-    for seg in segments:
-        audio_bytes = seg["audio_bytes"]
-        pause_ms = seg.get("pause_after_ms", 400)
+    if segments and AUDIO_ASSEMBLY_MODE == "frames" and bgm_path:
+        logger.info("BGM needs decoded narration, assembling from PCM instead of MP3 frames")
+    elif segments and AUDIO_ASSEMBLY_MODE == "frames":
+        assembled = _assemble_frames(segments, output_path, tags)
+        if assembled is not None:
+            transcode_renditions(output_path, renditions or {}, tags)
+            # Each part was encoded on its own, so there is no single encoder delay
+            duration_seconds = _finish_master(output_path, segments, *assembled, 0, tags, index)
+            logger.info("Assembled audio (MP3 frames): %.1f seconds -> %s", duration_seconds, output_path)
+            return duration_seconds
+        logger.info("No MP3 segments to join frame by frame, assembling from PCM")
 
-        if not audio_bytes:
-            chunk = AudioSegment.silent(duration=500)
-        else:
-            fmt = seg.get("format", "mp3")
-            chunk = AudioSegment.from_file(io.BytesIO(audio_bytes), format=fmt)
+    if segments:
+        samples, rate, spans = _concatenate(
+            [_load_chunk(seg) for seg in segments],
+            [seg.get("pause_after_ms", 400) for seg in segments],
+        )
+    else:
+        rate = TTS_PCM_SAMPLE_RATE
+        samples = np.zeros((rate // 2, 1), dtype=np.int16)
+        spans = []
+    channels = samples.shape[1]
+    # The BGM bed is mixed block by block on its way into the encoder
+    mix = BgmBed(bgm_path, rate, channels, len(samples)).mix_into if bgm_path else None
 
-        # Initialise combined from first real segment to inherit its sample rate/channels
-        if combined is None:
-            combined = chunk
-        else:
-            combined += chunk
+    with StreamingMp3Encoder(output_path, rate, channels, tags, mix=mix, renditions=renditions) as encoder:
+        for start in range(0, len(samples), _ENCODE_BLOCK_FRAMES):
+            encoder.write(samples[start:start + _ENCODE_BLOCK_FRAMES])
 
-        if pause_ms > 0:
-            # Generate silence matching the audio properties
-            silence = AudioSegment.silent(
-                duration=pause_ms,
-                frame_rate=combined.frame_rate,
-            )
-            combined += silence
-
-    if combined is None:
-        combined = AudioSegment.silent(duration=500)
-
-    export_kwargs = {
-        "format": "mp3",
-        "codec": "libmp3lame",
-        "bitrate": "192k",
-        "parameters": ["-q:a", "0"],
-    }
-    if tags:
-        export_kwargs["tags"] = tags
-    combined.export(output_path, **export_kwargs)
-
-    duration_seconds = len(combined) / 1000.0
+    _finish_master(output_path, segments, spans, rate, STREAM_DELAY, tags, index)
+    duration_seconds = encoder.duration_ms / 1000.0
     logger.info("Assembled audio: %.1f seconds -> %s", duration_seconds, output_path)
     return duration_seconds
+
+
+def _finish_master(
+    output_path: str,
+    segments: list[dict],
+    spans: list[tuple[int, int, int]],
+    rate: int,
+    delay: int,
+    tags: dict | None,
+    index: dict | None,
+) -> float:
+    """Write chapters into the MP3's tag and fill the segment index; returns the duration.
+
+    spans holds, per segment, the sample where it starts, where its audio
+    ends and where the next one starts (after the pause), at `rate`. delay
+    is the offset between those samples and the decoded MP3 frames (see
+    audio.mp3frames.STREAM_DELAY), 0 when frames were joined part by part.
+
+    The index maps each segment_id to its samples ("start", "end", "next"),
+    the MP3 frames [first, end) covering start..next ("frames") and their
+    byte range in the file ("bytes"); "loudness_lufs" is the target the
+    segments were normalized to, None when they were not.
+    """
+    entries = {}
+    for i, (seg, (start, end, next_start)) in enumerate(zip(segments, spans)):
+        title = seg.get("title") or f"Segment {seg.get('segment_id', i + 1)}"
+        entries[str(seg.get("segment_id", i + 1))] = {
+            "title": title, "start": start, "end": end, "next": next_start,
+        }
+    total = spans[-1][2] if spans else 0
+    _write_master_tag(output_path, tags, entries, rate)
+    if index is not None:
+        index.clear()
+        index.update({
+            "sample_rate": rate, "delay": delay, "loudness_lufs": _loudness_target(), "segments": entries,
+        })
+        _index_frames(output_path, index)
+    return total / rate
+
+
+def _write_master_tag(output_path: str, tags: dict | None, entries: dict, rate: int):
+    """Replace the MP3's ID3 tag with tags plus one chapter per index entry."""
+    with open(output_path, "rb") as f:
+        data = f.read()
+    with open(output_path, "wb") as f:
+        f.write(id3v2_tag(tags, _chapters(entries, rate)))
+        f.write(memoryview(data)[id3v2_size(data):])
+
+
+def _chapters(entries: dict, rate: int) -> list[tuple[str, int, int]]:
+    return [
+        (entry["title"], round(1000 * entry["start"] / rate), round(1000 * entry["next"] / rate))
+        for entry in entries.values()
+    ]
+
+
+def _index_frames(output_path: str, index: dict):
+    """Fill in each index entry's frame and byte ranges from the MP3 on disk."""
+    with open(output_path, "rb") as f:
+        data = f.read()
+    frames = parse_frames(data)
+    if not frames:
+        return
+    per_frame = frames[0].format.samples_per_frame
+    index["samples_per_frame"] = per_frame
+    index["audio_start"] = frames[0].offset
+    offsets = [frame.offset for frame in frames] + [frames[-1].offset + frames[-1].length]
+    entries = list(index["segments"].values())
+    for i, entry in enumerate(entries):
+        first = min((entry["start"] + index["delay"]) // per_frame, len(frames))
+        last = min((entry["next"] + index["delay"]) // per_frame, len(frames))
+        if i == len(entries) - 1:
+            # The last segment owns the encoder's flush frames too
+            last = len(frames)
+        entry["frames"] = [first, last]
+        entry["bytes"] = [offsets[first], offsets[last]]
+
+
+def splice_segments(
+    mp3_path: str,
+    index: dict,
+    replacements: dict[int, dict],
+    tags: dict | None = None,
+) -> float | None:
+    """Replace segments of an assembled MP3 in place, re-encoding only the frames around them.
+
+    Args:
+        mp3_path: MP3 written by assemble_audio without a BGM bed (the bed
+            under one segment cannot be rebuilt on its own).
+        index: Its segment index (see assemble_audio); updated in place.
+        replacements: segment_id → new segment dict, as for assemble_audio.
+        tags: ID3 tags to write back along with the updated chapters.
+
+    In an MP3 encoded from PCM, the frames from the first one wholly inside
+    the pause before a segment up to the one where the next segment starts
+    are re-encoded from the new audio, and the rest are copied. The cuts
+    fall in silence and the master is encoded without the bit reservoir,
+    so no copied frame depends on a replaced one. In an MP3 joined frame by
+    frame, the segment's own frames and pause frames are swapped out.
+
+    Returns:
+        The new duration in seconds, or None, leaving the file untouched,
+        when the index does not cover a replacement, the master was
+        loudness-normalized to another target or a pause is too short to
+        cut in; the caller then assembles the story again.
+    """
+    with open(mp3_path, "rb") as f:
+        data = f.read()
+    frames = parse_frames(data)
+    entries = {key: dict(entry) for key, entry in index.get("segments", {}).items()}
+    if (
+        not frames
+        or frames[0].format.sample_rate != index.get("sample_rate")
+        or frames[0].format.samples_per_frame != index.get("samples_per_frame")
+        or any(str(segment_id) not in entries for segment_id in replacements)
+        # New audio would be scaled differently from the segments around it
+        or (index["delay"] and index.get("loudness_lufs") != _loudness_target())
+    ):
+        return None
+    fmt = frames[0].format
+    chunks = [data[frame.offset:frame.offset + frame.length] for frame in frames]
+    order = list(entries)
+
+    # Last first, so the positions of the segments still to splice stay valid
+    for segment_id in sorted(replacements, key=lambda sid: entries[str(sid)]["start"], reverse=True):
+        key = str(segment_id)
+        position = order.index(key)
+        entry = entries[key]
+        replacement = replacements[segment_id]
+        if index["delay"]:
+            spliced = _splice_encoded(
+                entry, entries[order[position - 1]] if position else None,
+                position == len(order) - 1, replacement, fmt, index["delay"], len(chunks),
+            )
+        else:
+            spliced = _splice_joined(entry, replacement, fmt)
+        if spliced is None:
+            logger.info("Segment %s cannot be spliced in place", segment_id)
+            return None
+        first, end, new_chunks, new_end, new_next = spliced
+        chunks[first:end] = new_chunks
+        shift = new_next - entry["next"]
+        entry.update(end=new_end, next=new_next, title=replacement.get("title") or entry["title"])
+        for later in order[position + 1:]:
+            for field in ("start", "end", "next"):
+                entries[later][field] += shift
+
+    rate = fmt.sample_rate
+    total = entries[order[-1]]["next"]
+    per_frame = fmt.samples_per_frame
+    if index["delay"]:
+        delay = ENCODER_DELAY
+        padding = min(max(len(chunks) * per_frame - total - ENCODER_DELAY, 0), 0xFFF)
+    else:
+        delay = padding = 0
+    xing_size = len(xing_frame(fmt, [], 0))
+    offsets = []
+    position = xing_size
+    for chunk in chunks:
+        offsets.append(position)
+        position += len(chunk)
+
+    part_path = f"{mp3_path}.part"
+    with open(part_path, "wb") as out:
+        out.write(id3v2_tag(tags, _chapters(entries, rate)))
+        out.write(xing_frame(fmt, offsets, position, delay, padding))
+        for chunk in chunks:
+            out.write(chunk)
+    os.replace(part_path, mp3_path)
+
+    index["segments"] = entries
+    _index_frames(mp3_path, index)
+    logger.info("Spliced %d segments into %s", len(replacements), mp3_path)
+    return total / rate
+
+
+def _splice_encoded(
+    entry: dict,
+    previous: dict | None,
+    last: bool,
+    replacement: dict,
+    fmt: StreamFormat,
+    delay: int,
+    frame_count: int,
+) -> tuple[int, int, list[bytes], int, int] | None:
+    """Re-encode the frames around one segment of a PCM-encoded MP3.
+
+    Frame f of the master decodes samples [f * n - delay, (f + 1) * n - delay)
+    for n samples per frame, and so does frame f - first of an encode whose
+    input starts at sample first * n. Returns (first, end, new frames, new
+    end, new next) or None when the pauses leave no silent frame to cut at.
+    """
+    per_frame = fmt.samples_per_frame
+    samples = _segment_samples(_load_chunk(replacement), fmt.sample_rate, fmt.channels)
+    pause = int(max(replacement.get("pause_after_ms", 400), 0) * fmt.sample_rate / 1000.0)
+    start = entry["start"]
+    new_end = start + len(samples)
+
+    first = start // per_frame
+    # The frame before the cut, and the encoder's priming, must hold only silence
+    if previous is not None and (first - 1) * per_frame - delay < previous["end"]:
+        return None
+
+    if last:
+        end = frame_count
+        new_next = new_end + pause
+        length = new_next - first * per_frame
+        wanted = None
+    else:
+        end = (entry["next"] + delay) // per_frame
+        if (end - 1) * per_frame - delay < entry["end"]:
+            return None
+        # Where the next segment starts within the first copied frame
+        lead_in = entry["next"] - (end * per_frame - delay)
+        new_last = max(
+            round((new_end + pause - lead_in + delay) / per_frame),
+            -(-(new_end + delay) // per_frame) + 1,
+        )
+        new_next = new_last * per_frame - delay + lead_in
+        wanted = new_last - first
+        # One more frame of input so the last wanted frame is complete
+        length = (wanted + 1) * per_frame
+
+    pcm = np.zeros((length, fmt.channels), dtype=np.int16)
+    offset = start - first * per_frame
+    pcm[offset:offset + len(samples)] = samples[:length - offset]
+    audio = AudioSegment(
+        data=pcm.tobytes(), sample_width=2, frame_rate=fmt.sample_rate, channels=fmt.channels,
+    )
+    data = encode_part(audio, fmt, reservoir=False)
+    frames = parse_frames(data)
+    if wanted is not None:
+        if len(frames) < wanted:
+            return None
+        frames = frames[:wanted]
+    new_chunks = [data[frame.offset:frame.offset + frame.length] for frame in frames]
+    return first, end, new_chunks, new_end, new_next
+
+
+def _splice_joined(
+    entry: dict, replacement: dict, fmt: StreamFormat,
+) -> tuple[int, int, list[bytes], int, int] | None:
+    """Swap one segment's frames and pause frames in a frame-joined MP3."""
+    if "frames" not in entry:
+        return None
+    first, end = entry["frames"]
+    data, frames = _segment_frames(replacement, fmt)
+    if data is None:
+        data = encode_part(_load_chunk(replacement), fmt)
+        frames = parse_frames(data)
+    frame_ms = 1000.0 * fmt.samples_per_frame / fmt.sample_rate
+    pause_frames = round(max(replacement.get("pause_after_ms", 400), 0) / frame_ms)
+    new_chunks = [data[frame.offset:frame.offset + frame.length] for frame in frames]
+    new_end = entry["start"] + len(new_chunks) * fmt.samples_per_frame
+    new_chunks += [silent_frame(fmt)] * pause_frames
+    new_next = entry["start"] + len(new_chunks) * fmt.samples_per_frame
+    return first, end, new_chunks, new_end, new_next
+
+
+class ProgressivePublisher:
+    """Publish the finished prefix of a story as HLS chunks while the rest is synthesized.
+
+    Results are passed to add() in story order (see synthesize_story's
+    on_result); each is decoded, converted to mono at TTS_PCM_SAMPLE_RATE and
+    written with its pause into a SegmentedMp3Encoder writing playlist_path.
+    The preview carries no BGM, whose fade-out needs the final length; the
+    full assembly replaces it when the story is done. Publishing is best
+    effort: a failure stops the preview and never the synthesis.
+    """
+
+    def __init__(self, playlist_path: str, chunk_seconds: float):
+        os.makedirs(os.path.dirname(playlist_path), exist_ok=True)
+        self._encoder: SegmentedMp3Encoder | None = None
+        try:
+            self._encoder = SegmentedMp3Encoder(playlist_path, TTS_PCM_SAMPLE_RATE, 1, chunk_seconds)
+        except OSError as e:
+            logger.warning("Progressive publishing unavailable: %s", e)
+
+    def add(self, result: dict):
+        if self._encoder is None:
+            return
+        try:
+            self._encoder.write(_segment_samples(_load_chunk(result), TTS_PCM_SAMPLE_RATE, 1))
+            pause_ms = max(result.get("pause_after_ms", 400), 0)
+            self._encoder.write_silence(int(pause_ms * TTS_PCM_SAMPLE_RATE / 1000.0))
+            self._encoder.flush()
+        except Exception as e:
+            logger.warning("Progressive publishing stopped at segment %s: %s", result.get("segment_id"), e)
+            self.abort()
+
+    def close(self):
+        """Publish the last chunk and mark the playlist complete."""
+        if self._encoder is None:
+            return
+        try:
+            self._encoder.close()
+            self._encoder = None
+        except Exception as e:
+            logger.warning("Progressive publishing failed to finish: %s", e)
+            self.abort()
+
+    def abort(self):
+        if self._encoder is not None:
+            self._encoder.abort()
+            self._encoder = None
+
+
+def _concatenate(
+    chunks: list[AudioSegment], pauses_ms: list[int],
+) -> tuple[np.ndarray, int, list[tuple[int, int, int]]]:
+    """Join chunks, each followed by its pause, in one preallocated 16-bit buffer.
+
+    Chunks are converted to a canonical format (the highest sample rate and
+    channel count among them) and loudness-normalized, so each is resampled
+    and scaled at most once and the story is copied once, instead of on
+    every append. Returns the samples, shaped (frames, channels), their
+    frame rate, and each chunk's span (start, end, start of the next chunk)
+    in frames.
+    """
+    rate = max(chunk.frame_rate for chunk in chunks)
+    channels = max(chunk.channels for chunk in chunks)
+
+    converted = [_segment_samples(chunk, rate, channels) for chunk in chunks]
+    pause_frames = [int(max(pause_ms, 0) * rate / 1000.0) for pause_ms in pauses_ms]
+
+    total = sum(len(samples) for samples in converted) + sum(pause_frames)
+    buffer = np.zeros((total, channels), dtype=np.int16)
+    spans = []
+    offset = 0
+    for samples, pause in zip(converted, pause_frames):
+        buffer[offset:offset + len(samples)] = samples
+        # Pauses are left as the zeros the buffer was created with
+        spans.append((offset, offset + len(samples), offset + len(samples) + pause))
+        offset += len(samples) + pause
+
+    return buffer, rate, spans
+
+
+def _assemble_streaming(
+    segments: list[dict],
+    output_path: str,
+    tags: dict | None,
+    bgm_path: str | None = None,
+    renditions: dict[str, str] | None = None,
+) -> tuple[list[tuple[int, int, int]], int]:
+    """Encode segments and pauses through one ffmpeg process; returns the spans and rate."""
+    formats = [_probe_format(seg) for seg in segments]
+    rate = max(frame_rate for frame_rate, _, _ in formats)
+    channels = max(count for _, count, _ in formats)
+
+    mix = None
+    if bgm_path:
+        # The fade-out needs the story length up front; header lengths are close enough
+        total_frames = sum(
+            int(seconds * rate) + int(max(seg.get("pause_after_ms", 400), 0) * rate / 1000.0)
+            for seg, (_, _, seconds) in zip(segments, formats)
+        )
+        mix = BgmBed(bgm_path, rate, channels, total_frames).mix_into
+
+    spans = []
+    with StreamingMp3Encoder(output_path, rate, channels, tags, mix=mix, renditions=renditions) as encoder:
+        for seg in segments:
+            start = encoder.frames_written
+            encoder.write(_segment_samples(_load_chunk(seg), rate, channels))
+            end = encoder.frames_written
+            pause_ms = max(seg.get("pause_after_ms", 400), 0)
+            encoder.write_silence(int(pause_ms * rate / 1000.0))
+            spans.append((start, end, encoder.frames_written))
+    return spans, rate
+
+
+def _assemble_frames(
+    segments: list[dict], output_path: str, tags: dict | None,
+) -> tuple[list[tuple[int, int, int]], int] | None:
+    """Join MP3 segments frame by frame; returns the spans (in samples) and rate.
+
+    The stream format is taken from the first MP3 segment. Segments in that
+    format are copied as-is, others are re-encoded to it, and pauses become
+    cached silent frames, rounded to whole frames. Returns None when there is
+    no MP3 segment to take the format from.
+    """
+    target = None
+    for seg in segments:
+        if seg.get("format") == "mp3" and seg.get("audio_path") and os.path.isfile(seg["audio_path"]):
+            with open(seg["audio_path"], "rb") as f:
+                frames = parse_frames(f.read(8192))
+            if frames:
+                target = frames[0].format
+                break
+    if target is None:
+        return None
+
+    silence = silent_frame(target)
+    per_frame = target.samples_per_frame
+    frame_ms = 1000.0 * per_frame / target.sample_rate
+    # Offsets of every audio frame relative to the Xing frame, for its seek table
+    offsets: list[int] = []
+    spans = []
+    reencoded = 0
+    with open(output_path, "wb") as out:
+        out.write(id3v2_tag(tags))
+        xing_at = out.tell()
+        # Same size as the final header, which needs the totals known only at the end
+        position = len(xing_frame(target, [], 0))
+        out.write(bytes(position))
+
+        for seg in segments:
+            data, frames = _segment_frames(seg, target)
+            if data is None:
+                reencoded += 1
+                data = encode_part(_load_chunk(seg), target)
+                frames = parse_frames(data)
+            start = len(offsets) * per_frame
+            for frame in frames:
+                offsets.append(position)
+                out.write(data[frame.offset:frame.offset + frame.length])
+                position += frame.length
+            end = len(offsets) * per_frame
+            for _ in range(round(max(seg.get("pause_after_ms", 400), 0) / frame_ms)):
+                offsets.append(position)
+                out.write(silence)
+                position += len(silence)
+            spans.append((start, end, len(offsets) * per_frame))
+
+        out.seek(xing_at)
+        out.write(xing_frame(target, offsets, position))
+
+    if reencoded:
+        logger.info("Re-encoded %d/%d segments that did not match %s", reencoded, len(segments), target)
+    return spans, target.sample_rate
+
+
+def _segment_frames(seg: dict, target: StreamFormat) -> tuple[bytes | None, list]:
+    """The segment's MP3 bytes and frames if it can be copied into a `target` stream."""
+    audio_path = seg.get("audio_path")
+    if seg.get("format") != "mp3" or not audio_path or not os.path.isfile(audio_path):
+        return None, []
+    with open(audio_path, "rb") as f:
+        data = f.read()
+    frames = parse_frames(data)
+    if not frames or any(frame.format != target for frame in frames):
+        return None, []
+    return data, frames
+
+
+def _probe_format(seg: dict) -> tuple[int, int, float]:
+    """(frame_rate, channels, seconds) of a segment, read from headers where the format allows."""
+    fmt = seg.get("format", "mp3")
+    audio_path = seg.get("audio_path")
+    if fmt == "pcm" and audio_path and os.path.isfile(audio_path):
+        return TTS_PCM_SAMPLE_RATE, 1, os.path.getsize(audio_path) / 2 / TTS_PCM_SAMPLE_RATE
+    if fmt == "wav" and audio_path and os.path.isfile(audio_path):
+        try:
+            with wave.open(audio_path) as wav:
+                return wav.getframerate(), wav.getnchannels(), wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    if fmt == "mp3":
+        data = None
+        if audio_path and os.path.isfile(audio_path):
+            with open(audio_path, "rb") as f:
+                data = f.read()
+        elif not audio_path:
+            data = seg.get("audio_bytes")
+        frames = parse_frames(data) if data else []
+        if frames:
+            first = frames[0].format
+            return first.sample_rate, first.channels, len(frames) * first.samples_per_frame / first.sample_rate
+    chunk = _load_chunk(seg)
+    return chunk.frame_rate, chunk.channels, len(chunk) / 1000.0
+
+
+def _to_samples(chunk: AudioSegment, rate: int, channels: int) -> np.ndarray:
+    """Convert a chunk to 16-bit samples shaped (frames, channels) at the given rate."""
+    chunk = chunk.set_sample_width(2).set_frame_rate(rate).set_channels(channels)
+    return np.frombuffer(chunk.raw_data, dtype=np.int16).reshape(-1, channels)
+
+
+def _loudness_target() -> float | None:
+    return AUDIO_LOUDNESS_TARGET_LUFS if AUDIO_LOUDNESS_NORMALIZE else None
+
+
+def _segment_samples(chunk: AudioSegment, rate: int, channels: int) -> np.ndarray:
+    """A segment's samples as written into the story: converted and loudness-normalized."""
+    samples = _to_samples(chunk, rate, channels)
+    if AUDIO_LOUDNESS_NORMALIZE:
+        samples = normalize(samples, rate, AUDIO_LOUDNESS_TARGET_LUFS)
+    return samples
+
+
+def _load_chunk(seg: dict) -> AudioSegment:
+    """Decode one segment from its file or bytes; missing audio becomes 500 ms of silence."""
+    fmt = seg.get("format", "mp3")
+    audio_path = seg.get("audio_path")
+    if audio_path:
+        if os.path.isfile(audio_path) and os.path.getsize(audio_path) > 0:
+            return load_audio(audio_path, fmt)
+        logger.warning("Segment audio missing at %s, inserting silence", audio_path)
+        return AudioSegment.silent(duration=500)
+
+    audio_bytes = seg.get("audio_bytes")
+    if not audio_bytes:
+        return AudioSegment.silent(duration=500)
+    return load_audio(io.BytesIO(audio_bytes), fmt)
+
+
+def load_audio(source, fmt: str) -> AudioSegment:
+    """Decode a path or file-like object in the given format.
+
+    Raw "pcm" (the TTS API's 16-bit mono little-endian output) and WAV are
+    read in-process; only compressed formats go through ffmpeg.
+    """
+    if fmt == "pcm":
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                data = f.read()
+        else:
+            data = source.read()
+        # A stream cut mid-sample would be rejected by pydub
+        data = data[:len(data) - len(data) % 2]
+        return AudioSegment(data=data, sample_width=2, frame_rate=TTS_PCM_SAMPLE_RATE, channels=1)
+    return AudioSegment.from_file(source, format=fmt)
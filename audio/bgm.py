@@ -1,19 +1,20 @@
-"""Background music generation using Google Lyria 2 (Vertex AI) and overlay mixing."""
+"""Background music generation using Google Lyria 2 (Vertex AI) and the bed mixed under narration."""
 
 import base64
 import io
 import logging
-import os
 
+import numpy as np
 import requests
 from pydub import AudioSegment
+from pydub.utils import db_to_float
 
 from config import (
     GOOGLE_CLOUD_LOCATION,
     GOOGLE_CLOUD_PROJECT,
     GOOGLE_SERVICE_ACCOUNT_FILE,
-    STORAGE_DIR,
 )
+from ratelimit.limiter import call_with_retry
 
 logger = logging.getLogger(__name__)
 
@@ -29,20 +30,35 @@ MOOD_MUSIC_PROMPTS = {
 
 DEFAULT_PROMPT = "gentle cheerful children's background music, soft and pleasant"
 
-# BGM volume reduction in dB (relative to narration)
-BGM_VOLUME_DB = -20
-
-
-def generate_bgm(mood: str, duration_seconds: float, story_id: str) -> str | None:
-    """Generate background music via Lyria 2 and save as MP3.
+# BGM volume reduction in dB (relative to narration) while someone is speaking
+BGM_VOLUME_DB = -26
+# BGM level in pauses between lines, the former flat level; the bed ducks down
+# to BGM_VOLUME_DB under speech
+BGM_PAUSE_VOLUME_DB = -20
+# Narration louder than this (RMS, dBFS) over a window counts as speech
+BGM_DUCK_THRESHOLD_DBFS = -45
+# Ducking envelope: analysis window, ramp-down time before speech, hold after it
+BGM_DUCK_WINDOW_MS = 10
+BGM_DUCK_ATTACK_MS = 60
+BGM_DUCK_RELEASE_MS = 150
+# BGM fades at the start and end of the story
+BGM_FADE_IN_S = 2.0
+BGM_FADE_OUT_S = 3.0
+
+
+def generate_bgm(mood: str, output_path: str) -> bool:
+    """Generate background music via Lyria 2 and save it, decoded, as WAV.
+
+    The track is looped under the narration at assembly, so it does not need
+    to match any story's length. Stories get their track from the mood-keyed
+    loop library in audio.bgm_library rather than calling this directly.
 
     Args:
         mood: Story mood for prompt selection.
-        duration_seconds: Target duration of the BGM track.
-        story_id: Used for the output filename.
+        output_path: Where to write the WAV file.
 
     Returns:
-        Local file path to the generated BGM MP3, or None on failure.
+        True if the track was written.
     """
     try:
         import google.auth.transport.requests
@@ -77,78 +93,144 @@ def generate_bgm(mood: str, duration_seconds: float, story_id: str) -> str | Non
             "Content-Type": "application/json",
         }
 
-        resp = requests.post(endpoint, headers=headers, json=payload)
+        def _predict() -> requests.Response:
+            resp = requests.post(endpoint, headers=headers, json=payload)
+            # Raise throttling/server errors so call_with_retry can back off and retry
+            if resp.status_code == 429 or resp.status_code >= 500:
+                resp.raise_for_status()
+            return resp
+
+        resp = call_with_retry(_predict, "google", "lyria-002")
         if not resp.ok:
             logger.error(
-                "Lyria 2 API error %s for story %s: %s",
-                resp.status_code, story_id, resp.text,
+                "Lyria 2 API error %s for mood %s: %s",
+                resp.status_code, mood, resp.text,
             )
-            return None
+            return False
         predictions = resp.json().get("predictions", [])
 
         if not predictions:
-            logger.error("Lyria 2 returned no predictions for story %s", story_id)
-            return None
+            logger.error("Lyria 2 returned no predictions for mood %s", mood)
+            return False
 
         audio_data = base64.b64decode(predictions[0]["bytesBase64Encoded"])
 
-        bgm_dir = os.path.join(STORAGE_DIR, "bgm")
-        os.makedirs(bgm_dir, exist_ok=True)
-        bgm_path = os.path.join(bgm_dir, f"{story_id}.mp3")
-
-        # Convert to MP3 via pydub (Lyria outputs WAV/PCM)
+        # Stored as WAV so mixing reads it without an ffmpeg decode
         audio_segment = AudioSegment.from_file(io.BytesIO(audio_data))
-        audio_segment.export(bgm_path, format="mp3", codec="libmp3lame", bitrate="192k")
+        audio_segment.export(output_path, format="wav")
 
-        logger.info("Generated BGM for story %s: %s", story_id, bgm_path)
-        return bgm_path
+        logger.info("Generated BGM for mood %s: %s", mood, output_path)
+        return True
 
     except Exception as e:
-        logger.error("BGM generation failed for story %s: %s", story_id, e)
-        return None
-
+        logger.error("BGM generation failed for mood %s: %s", mood, e)
+        return False
 
-def mix_bgm(narration_path: str, bgm_path: str, output_path: str, tags: dict | None = None) -> float:
-    """Overlay BGM under narration audio and export.
 
-    The BGM is looped/trimmed to match the narration length and reduced in volume.
+class BgmBed:
+    """Looped, faded BGM that ducks under speech, mixed block by block into narration samples.
 
-    Args:
-        narration_path: Path to the narration MP3.
-        bgm_path: Path to the BGM MP3.
-        output_path: Path to write the final mixed MP3.
-        tags: Optional ID3 metadata tags (e.g. title, artist, album).
+    The BGM is decoded once and held at the narration's rate and channel
+    count; narration is never decoded or re-encoded to mix it.
+    """
 
-    Returns:
-        Duration in seconds of the final audio.
+    def __init__(self, bgm_path: str, frame_rate: int, channels: int, total_frames: int):
+        bgm = AudioSegment.from_file(bgm_path)
+        bgm = bgm.set_sample_width(2).set_frame_rate(frame_rate).set_channels(channels)
+        loop = np.frombuffer(bgm.raw_data, dtype=np.int16).reshape(-1, channels)
+        self._loop = loop.astype(np.float32)
+        self.total_frames = total_frames
+        self._fade_in = max(1, int(BGM_FADE_IN_S * frame_rate))
+        self._fade_out = max(1, int(BGM_FADE_OUT_S * frame_rate))
+        self._ducker = _Ducker(frame_rate)
+
+    def mix_into(self, block: np.ndarray, start: int):
+        """Add the bed to int16 samples shaped (frames, channels) that begin at frame `start`.
+
+        Blocks must be passed in order: the ducking envelope carries over
+        from one block to the next.
+        """
+        if not len(self._loop):
+            return
+        positions = np.arange(start, start + len(block))
+        fade = np.minimum(positions / self._fade_in, (self.total_frames - positions) / self._fade_out)
+        # Fade and ducking fold into one gain per frame, applied with one multiply per sample
+        gain = np.clip(fade, 0.0, 1.0).astype(np.float32) * self._ducker.gain(block)
+        bed = self._loop[positions % len(self._loop)] * gain[:, None]
+        mixed = block.astype(np.int32) + bed.astype(np.int32)
+        # Saturate like AudioSegment.overlay
+        np.clip(mixed, -32768, 32767, out=mixed)
+        block[:] = mixed
+
+
+class _Ducker:
+    """Sidechain gain for the bed, derived from the narration it is mixed into.
+
+    Speech is detected per window from RMS; the resulting mask is widened
+    by the release hold and the attack lookahead and smoothed into a ramp
+    with running sums, so the whole block is handled without a per-sample
+    loop. The last windows of each block are kept as context for the next,
+    along with the ducking already applied to them: lookahead reaches no
+    further than the block being mixed, so speech starting a block (as every
+    segment does when streaming) ramps the bed down from its onset.
     """
-    narration = AudioSegment.from_mp3(narration_path)
-    bgm = AudioSegment.from_mp3(bgm_path)
-
-    # Loop BGM if shorter than narration
-    narration_len = len(narration)
-    if len(bgm) < narration_len:
-        repeats = (narration_len // len(bgm)) + 1
-        bgm = bgm * repeats
-
-    # Trim to narration length and reduce volume
-    bgm = bgm[:narration_len]
-    bgm = bgm + BGM_VOLUME_DB
-
-    # Add fade in/out to BGM
-    bgm = bgm.fade_in(2000).fade_out(3000)
-
-    mixed = narration.overlay(bgm)
-    export_kwargs = {
-        "format": "mp3",
-        "codec": "libmp3lame",
-        "bitrate": "192k",
-        "parameters": ["-q:a", "0"],
-    }
-    if tags:
-        export_kwargs["tags"] = tags
-    mixed.export(output_path, **export_kwargs)
-
-    duration = len(mixed) / 1000.0
-    logger.info("Mixed BGM into narration: %.1f seconds -> %s", duration, output_path)
-    return duration
+
+    def __init__(self, frame_rate: int):
+        self._window = max(1, frame_rate * BGM_DUCK_WINDOW_MS // 1000)
+        self._attack = max(1, BGM_DUCK_ATTACK_MS // BGM_DUCK_WINDOW_MS)
+        self._release = max(1, BGM_DUCK_RELEASE_MS // BGM_DUCK_WINDOW_MS)
+        self._threshold = (32768 * db_to_float(BGM_DUCK_THRESHOLD_DBFS)) ** 2
+        self._speech_gain = db_to_float(BGM_VOLUME_DB)
+        self._pause_gain = db_to_float(BGM_PAUSE_VOLUME_DB)
+        self._context = np.zeros(self._release + self._attack, dtype=bool)
+        self._applied = np.zeros(len(self._context), dtype=bool)
+        # Gain applied to the last frame mixed
+        self._last_gain = self._pause_gain
+
+    def gain(self, block: np.ndarray) -> np.ndarray:
+        """Bed gain for every frame of an int16 (frames, channels) narration block."""
+        frames = len(block)
+        windows = -(-frames // self._window)
+        power = np.zeros(windows * self._window, dtype=np.float32)
+        samples = block.astype(np.float32)
+        power[:frames] = np.einsum("ij,ij->i", samples, samples) / block.shape[1]
+        speech = power.reshape(windows, self._window).mean(axis=1) > self._threshold
+
+        # Windows carried over from the previous block keep the hold and ramp continuous
+        carried = len(self._context)
+        mask = np.concatenate((self._context, speech))
+        ducked = _window_any(mask, self._release, self._attack)
+        # Those windows are already mixed: an onset here is too late for their lookahead
+        ducked[:carried] = self._applied
+        self._context = mask[-carried:]
+        self._applied = ducked[-carried:]
+        amount = _moving_average(ducked.astype(np.float32), self._attack)[carried:]
+
+        window_gain = self._pause_gain + (self._speech_gain - self._pause_gain) * amount
+        centres = np.arange(windows) * self._window + self._window / 2
+        # Ramping from the previous block's last frame avoids a step at the boundary
+        gain = np.interp(
+            np.arange(frames),
+            np.concatenate(([-1], centres)),
+            np.concatenate(([self._last_gain], window_gain)),
+        ).astype(np.float32)
+        if frames:
+            self._last_gain = gain[-1]
+        return gain
+
+
+def _window_any(mask: np.ndarray, before: int, after: int) -> np.ndarray:
+    """True wherever mask is set within `before` windows behind or `after` ahead."""
+    counts = np.concatenate(([0], np.cumsum(mask)))
+    index = np.arange(len(mask))
+    low = np.maximum(index - before, 0)
+    high = np.minimum(index + after + 1, len(mask))
+    return counts[high] > counts[low]
+
+
+def _moving_average(values: np.ndarray, width: int) -> np.ndarray:
+    """Trailing mean over `width` windows, so a step turns into a linear ramp."""
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    index = np.arange(1, len(values) + 1)
+    low = np.maximum(index - width, 0)
+    return ((sums[index] - sums[low]) / (index - low)).astype(np.float32)
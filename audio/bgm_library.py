@@ -0,0 +1,126 @@
+"""Mood-keyed library of pre-generated BGM loops under STORAGE_DIR/bgm/library.
+
+The Lyria prompt depends only on the story mood, so loops are generated
+ahead of time and shared: a story picks one of its mood's loops, seeded by
+story_id so re-renders get the same track, and the pool is topped up in the
+background when it runs low. Only a mood with an empty pool generates a loop
+on the story's critical path.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from audio.bgm import MOOD_MUSIC_PROMPTS, generate_bgm
+from config import BGM_POOL_REFILL_BELOW, BGM_POOL_SIZE, STORAGE_DIR
+from credits.cost_tracker import record_system_cost
+from credits.pricing import COST_LYRIA2_PER_GENERATION
+from db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_DIR = os.path.join(STORAGE_DIR, "bgm", "library")
+# Moods without a prompt of their own share the default prompt's pool
+_DEFAULT_POOL = "default"
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bgm-refill")
+_refilling: set[str] = set()
+_lock = threading.Lock()
+
+
+def pick_loop(mood: str, story_id: str) -> tuple[str | None, bool]:
+    """Return (loop path, generated_now) for a story.
+
+    generated_now is True when the pool was empty and a loop had to be
+    generated for this story (the only case that costs a Lyria call here).
+    Returns (None, False) if no loop could be obtained.
+    """
+    pool = _pool_name(mood)
+    loops = _loops(pool)
+    generated_now = False
+    if not loops:
+        logger.info("BGM library: no loop for %s yet, generating one now", pool)
+        path = _generate_loop(pool)
+        if path:
+            loops = [path]
+            generated_now = True
+    refill(pool)
+    if not loops:
+        return None, False
+
+    index = int(hashlib.sha256(story_id.encode()).hexdigest(), 16) % len(loops)
+    return loops[index], generated_now
+
+
+def refill(mood: str):
+    """Top a mood's pool up to BGM_POOL_SIZE in the background if it is running low."""
+    pool = _pool_name(mood)
+    with _lock:
+        if pool in _refilling or len(_loops(pool)) >= BGM_POOL_REFILL_BELOW:
+            return
+        _refilling.add(pool)
+    _executor.submit(_refill, pool)
+
+
+def _refill(pool: str):
+    try:
+        while len(_loops(pool)) < BGM_POOL_SIZE:
+            if not _generate_loop(pool):
+                break
+            _record_refill_cost(pool)
+    finally:
+        with _lock:
+            _refilling.discard(pool)
+
+
+def _record_refill_cost(pool: str):
+    """Log a background loop's Lyria call as a system cost (no story pays for it)."""
+    db = SessionLocal()
+    try:
+        record_system_cost(
+            db, "bgm_pool", COST_LYRIA2_PER_GENERATION, f"BGM pool refill: {pool}"
+        )
+    except Exception as e:
+        logger.warning("BGM library: could not record refill cost for %s: %s", pool, e)
+    finally:
+        db.close()
+
+
+def _generate_loop(pool: str) -> str | None:
+    pool_dir = os.path.join(LIBRARY_DIR, pool)
+    os.makedirs(pool_dir, exist_ok=True)
+    path = os.path.join(pool_dir, f"{uuid.uuid4().hex}.wav")
+    # Written under a temporary name so a half-written loop is never picked
+    tmp_path = f"{path}.part"
+    # The default pool's name has no prompt of its own, so it gets DEFAULT_PROMPT
+    if not generate_bgm(pool, tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    _prune(pool)
+    logger.info("BGM library: added loop %s", path)
+    return path
+
+
+def _prune(pool: str):
+    """Drop the oldest loops beyond BGM_POOL_SIZE."""
+    loops = sorted(_loops(pool), key=os.path.getmtime)
+    for path in loops[:max(0, len(loops) - BGM_POOL_SIZE)]:
+        os.remove(path)
+
+
+def _loops(pool: str) -> list[str]:
+    pool_dir = os.path.join(LIBRARY_DIR, pool)
+    if not os.path.isdir(pool_dir):
+        return []
+    return sorted(
+        os.path.join(pool_dir, name) for name in os.listdir(pool_dir) if name.endswith(".wav")
+    )
+
+
+def _pool_name(mood: str | None) -> str:
+    return mood if mood in MOOD_MUSIC_PROMPTS else _DEFAULT_POOL
@@ -2,6 +2,8 @@
 
 import io
 import logging
+import struct
+import threading
 
 import numpy as np
 from pedalboard import (
@@ -58,6 +60,86 @@ def _build_board(effect: str) -> Pedalboard | None:
     raise ValueError(f"Unknown effect: {effect}")
 
 
+_boards: dict[str, Pedalboard] = {}
+_boards_lock = threading.Lock()
+# One lock per preset: a board carries plugin state while it processes
+_board_locks: dict[str, threading.Lock] = {}
+
+# Frames handed to each plugin at a time
+_CHUNK_FRAMES = 1 << 16
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _get_board(effect: str) -> tuple[Pedalboard | None, threading.Lock]:
+    """Return the process-wide board for a preset and the lock guarding it."""
+    with _boards_lock:
+        if effect not in _boards:
+            _boards[effect] = _build_board(effect)
+            _board_locks[effect] = threading.Lock()
+        return _boards[effect], _board_locks[effect]
+
+
+def _read_wav(audio_bytes: bytes) -> tuple[np.ndarray, int] | None:
+    """Map the data chunk of a 16-bit PCM or float32 WAV as (frames, channels) samples.
+
+    The returned array is a view over audio_bytes, not a copy. Returns
+    None for any other layout so the caller can fall back to a full decode.
+    """
+    if audio_bytes[:4] != b"RIFF" or audio_bytes[8:12] != b"WAVE":
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(audio_bytes):
+        chunk_id = audio_bytes[offset:offset + 4]
+        size = struct.unpack_from("<I", audio_bytes, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", audio_bytes, body)
+            if tag == _WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from("<H", audio_bytes, body + 24)[0]
+            fmt = (tag, channels, rate, bits)
+        elif chunk_id == b"data" and fmt is not None:
+            tag, channels, rate, bits = fmt
+            if (tag, bits) == (_WAVE_FORMAT_PCM, 16):
+                dtype = np.dtype("<i2")
+            elif (tag, bits) == (_WAVE_FORMAT_IEEE_FLOAT, 32):
+                dtype = np.dtype("<f4")
+            else:
+                return None
+            # Recorders that stream WAV leave the size at 0 or 0xFFFFFFFF
+            available = len(audio_bytes) - body
+            if size in (0, 0xFFFFFFFF) or size > available:
+                size = available
+            frames = size // (dtype.itemsize * channels)
+            samples = np.frombuffer(audio_bytes, dtype=dtype, count=frames * channels, offset=body)
+            return samples.reshape(frames, channels), rate
+        offset = body + size + (size & 1)
+    return None
+
+
+def _decode_fallback(audio_bytes: bytes) -> tuple[np.ndarray, int]:
+    seg = AudioSegment.from_file(io.BytesIO(audio_bytes), format="wav").set_sample_width(2)
+    samples = np.frombuffer(seg.raw_data, dtype=np.int16).reshape(-1, seg.channels)
+    return samples, seg.frame_rate
+
+
+def _write_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Serialize int16 (frames, channels) samples as a PCM WAV file."""
+    frames, channels = samples.shape
+    data_size = frames * channels * 2
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, _WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * channels * 2, channels * 2, 16,
+        b"data", data_size,
+    )
+    return header + samples.astype("<i2", copy=False).tobytes()
+
+
 def apply_effect(audio_bytes: bytes, effect: str) -> bytes:
     """Apply a voice effect preset to raw WAV bytes and return processed WAV bytes.
 
@@ -67,40 +149,21 @@ def apply_effect(audio_bytes: bytes, effect: str) -> bytes:
     if effect == "clean":
         return audio_bytes
 
-    board = _build_board(effect)
+    board, lock = _get_board(effect)
     if board is None:
         return audio_bytes
 
-    # Decode WAV via pydub
-    seg = AudioSegment.from_file(io.BytesIO(audio_bytes), format="wav")
-    sample_rate = seg.frame_rate
-    samples = np.array(seg.get_array_of_samples(), dtype=np.float32)
-
-    # Handle stereo
-    channels = seg.channels
-    if channels > 1:
-        samples = samples.reshape((-1, channels))
-    else:
-        samples = samples.reshape((-1, 1))
-
-    # Normalise to -1..1 range (pydub uses int16)
-    samples = samples / 32768.0
-
-    # Process through pedalboard (expects float32, shape = (samples, channels))
-    processed = board(samples, sample_rate)
-
-    # Clip and convert back to int16
-    processed = np.clip(processed, -1.0, 1.0)
-    processed_int = (processed * 32767).astype(np.int16)
-
-    # Rebuild AudioSegment
-    out_seg = AudioSegment(
-        data=processed_int.tobytes(),
-        sample_width=2,
-        frame_rate=sample_rate,
-        channels=channels,
-    )
+    decoded = _read_wav(audio_bytes)
+    samples, sample_rate = decoded if decoded is not None else _decode_fallback(audio_bytes)
+
+    # The only float copy of the recording; pedalboard expects float32 shaped (frames, channels)
+    if samples.dtype.kind == "i":
+        samples = samples.astype(np.float32)
+        samples *= np.float32(1 / 32768)
+    with lock:
+        # buffer_size feeds the board fixed-size chunks while keeping its latency compensation
+        processed = board(samples, sample_rate, buffer_size=_CHUNK_FRAMES, reset=True)
 
-    buf = io.BytesIO()
-    out_seg.export(buf, format="wav")
-    return buf.getvalue()
+    np.clip(processed, -1.0, 1.0, out=processed)
+    processed *= np.float32(32767)
+    return _write_wav(processed.astype(np.int16), sample_rate)
@@ -0,0 +1,210 @@
+"""Long-lived ffmpeg/libmp3lame process fed PCM incrementally."""
+
+import logging
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+from pydub import AudioSegment
+
+from config import AUDIO_OPUS_BITRATE
+
+logger = logging.getLogger(__name__)
+
+# Same encoder settings as the pydub exports elsewhere in audio/
+MP3_BITRATE = "192k"
+MP3_QUALITY = "0"
+# Chunks published while a story is still being synthesized
+PREVIEW_MP3_BITRATE = "64k"
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """An extra encoding of a story, produced by the same ffmpeg run as the MP3."""
+
+    extension: str
+    mime: str
+    args: tuple[str, ...]
+
+
+# Renditions by name; the MP3 master is always produced
+RENDITIONS = {
+    "opus": Rendition(
+        "opus", "audio/ogg",
+        ("-codec:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-vbr", "on", "-f", "opus"),
+    ),
+}
+
+# Silence is written in blocks of this many frames so it never needs a full buffer
+_SILENCE_BLOCK_FRAMES = 48000
+
+
+class StreamingMp3Encoder:
+    """Encode 16-bit PCM to MP3 as it is produced, writing output_path progressively.
+
+    Usage:
+        with StreamingMp3Encoder(path, 24000, 1, tags) as encoder:
+            encoder.write(samples)           # int16 array of shape (frames, channels)
+            encoder.write_silence(frames)
+
+    Only the block being written is held in memory. An optional
+    mix(block, start_frame) callback may add to each block (e.g. a BGM bed)
+    before it is encoded, silence included. `renditions` maps names from
+    RENDITIONS to extra output paths, encoded from the same PCM by the same
+    ffmpeg process. Leaving the context
+    without an exception waits for ffmpeg to finish and raises RuntimeError
+    if it failed.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        frame_rate: int,
+        channels: int,
+        tags: dict | None = None,
+        mix: Callable[[np.ndarray, int], None] | None = None,
+        renditions: dict[str, str] | None = None,
+    ):
+        self.output_path = output_path
+        self.mix = mix
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.frames_written = 0
+        command = [
+            AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y",
+            # Raw PCM needs no probing; without this ffmpeg buffers seconds of input first
+            "-probesize", "32", "-analyzeduration", "0",
+            "-f", "s16le", "-ar", str(frame_rate), "-ac", str(channels), "-i", "pipe:0",
+        ]
+        command += self._output_args(tags, renditions)
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def _output_args(self, tags: dict | None, renditions: dict[str, str] | None) -> list[str]:
+        return _output_args(self.output_path, tags, renditions)
+
+    def write(self, samples: np.ndarray):
+        """Append int16 samples shaped (frames, channels)."""
+        if self.mix is not None:
+            samples = np.array(samples, dtype=np.int16)
+            self.mix(samples, self.frames_written)
+        try:
+            self._process.stdin.write(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+        except BrokenPipeError:
+            raise self._failure() from None
+        self.frames_written += len(samples)
+
+    def flush(self):
+        """Hand everything written so far to ffmpeg."""
+        try:
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            raise self._failure() from None
+
+    def write_silence(self, frames: int):
+        block = np.zeros((min(frames, _SILENCE_BLOCK_FRAMES), self.channels), dtype=np.int16)
+        while frames > 0:
+            self.write(block[:frames])
+            frames -= min(frames, len(block))
+
+    @property
+    def duration_ms(self) -> int:
+        return round(1000 * self.frames_written / self.frame_rate)
+
+    def close(self):
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise self._failure()
+        self._stderr.close()
+
+    def _failure(self) -> RuntimeError:
+        """The error to raise once ffmpeg has exited early or with a failure."""
+        returncode = self._process.wait()
+        self._stderr.seek(0)
+        error = self._stderr.read().decode(errors="replace").strip()
+        self._stderr.close()
+        return RuntimeError(f"ffmpeg encoder exited with {returncode}: {error[-500:]}")
+
+    def abort(self):
+        self._process.kill()
+        self._process.wait()
+        self._stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class SegmentedMp3Encoder(StreamingMp3Encoder):
+    """Encode PCM as it is produced into numbered MP3 chunks listed in an HLS playlist.
+
+    ffmpeg's segment muxer cuts a chunk every `chunk_seconds` and appends it to
+    the playlist at playlist_path once it is complete; closing the encoder
+    writes the last chunk and #EXT-X-ENDLIST. Chunks carry no ID3 or Xing
+    headers and are encoded without the bit reservoir, so each decodes on
+    its own and the finished ones concatenate into a playable MP3.
+    """
+
+    def __init__(self, playlist_path: str, frame_rate: int, channels: int, chunk_seconds: float):
+        self.chunk_seconds = chunk_seconds
+        super().__init__(playlist_path, frame_rate, channels)
+
+    def _output_args(self, tags: dict | None, renditions: dict[str, str] | None) -> list[str]:
+        chunk_pattern = os.path.join(os.path.dirname(self.output_path), "chunk_%05d.mp3")
+        return [
+            "-codec:a", "libmp3lame", "-b:a", PREVIEW_MP3_BITRATE, "-reservoir", "0",
+            "-f", "segment", "-segment_time", str(self.chunk_seconds), "-segment_format", "mp3",
+            "-segment_format_options", "id3v2_version=0:write_xing=0",
+            "-segment_list", self.output_path, "-segment_list_type", "m3u8",
+            "-segment_list_flags", "+live", chunk_pattern,
+        ]
+
+
+def transcode_renditions(source_path: str, renditions: dict[str, str], tags: dict | None = None):
+    """Encode renditions from an already encoded file, for when no PCM was assembled."""
+    if not renditions:
+        return
+    command = [
+        AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y", "-i", source_path,
+    ]
+    for name, path in renditions.items():
+        command += _rendition_args(name, tags) + [path]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        error = result.stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"ffmpeg exited with {result.returncode}: {error[-500:]}")
+
+
+def _output_args(output_path: str, tags: dict | None, renditions: dict[str, str] | None) -> list[str]:
+    """ffmpeg output options for the MP3 master followed by each rendition."""
+    # Without the bit reservoir every frame decodes on its own, so segments
+    # can later be spliced in place (see audio.assembler.splice_segments)
+    args = [
+        "-codec:a", "libmp3lame", "-b:a", MP3_BITRATE, "-q:a", MP3_QUALITY, "-reservoir", "0",
+        "-id3v2_version", "4",
+    ]
+    args += _metadata_args(tags) + ["-f", "mp3", output_path]
+    for name, path in (renditions or {}).items():
+        args += _rendition_args(name, tags) + [path]
+    return args
+
+
+def _rendition_args(name: str, tags: dict | None) -> list[str]:
+    return list(RENDITIONS[name].args) + _metadata_args(tags)
+
+
+def _metadata_args(tags: dict | None) -> list[str]:
+    # -metadata applies to one output, so it is repeated for each
+    args = []
+    for key, value in (tags or {}).items():
+        args += ["-metadata", f"{key}={value}"]
+    return args
@@ -0,0 +1,124 @@
+"""Per-segment loudness normalization (ITU-R BS.1770 / EBU R128) in numpy.
+
+Segments come from different TTS voices and from user recordings, at
+levels that can be several dB apart. Each is measured on its own and
+scaled to a common integrated loudness as it is written into the story,
+so no separate loudnorm pass over the assembled audio is needed.
+
+The K-weighting filter is applied in the frequency domain: a segment is
+cut into 100 ms blocks, all blocks are transformed by one rfft call and
+their power spectra weighted by the filter's magnitude response. By
+Parseval that gives each block's K-weighted mean square; the 400 ms gating
+blocks of BS.1770 (75% overlap) are then means of four consecutive blocks.
+"""
+
+import math
+
+import numpy as np
+
+# Ceiling for a segment's sample peak after its gain, in dBFS
+PEAK_CEILING_DBFS = -1.0
+# Quiet segments are boosted at most this much, so breaths and near-silent
+# recordings are not pulled up to speech level
+MAX_BOOST_DB = 12.0
+# Gains smaller than this are not worth a pass over the samples
+MIN_GAIN_DB = 0.5
+
+_BLOCK_S = 0.1
+_BLOCKS_PER_GATE = 4
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+
+
+def integrated_loudness(samples: np.ndarray, rate: int) -> float:
+    """Gated integrated loudness in LUFS of samples shaped (frames, channels).
+
+    Channels are summed with equal weight (mono and stereo layouts). A
+    segment shorter than one gating block is measured as a single block.
+    Returns -inf when nothing passes the absolute gate.
+    """
+    block = int(rate * _BLOCK_S)
+    count = len(samples) // block
+    if count == 0:
+        block, count = len(samples), 1
+    if block == 0:
+        return -math.inf
+
+    # (channels, blocks, block) float32 view of the whole blocks
+    blocks = samples[:count * block].T.reshape(samples.shape[1], count, block).astype(np.float32)
+    blocks /= 32768.0
+    spectra = np.fft.rfft(blocks, axis=-1)
+    power = spectra.real ** 2 + spectra.imag ** 2
+    power *= _k_weighting(rate, block)
+    # Parseval: mean square of each block, summed over channels
+    energy = (power.sum(axis=-1) / (block * block)).sum(axis=0)
+
+    if count >= _BLOCKS_PER_GATE:
+        sums = np.cumsum(np.concatenate(([0.0], energy)))
+        gated = (sums[_BLOCKS_PER_GATE:] - sums[:-_BLOCKS_PER_GATE]) / _BLOCKS_PER_GATE
+    else:
+        gated = np.array([energy.mean()])
+
+    with np.errstate(divide="ignore"):
+        levels = -0.691 + 10 * np.log10(gated)
+    gated = gated[levels > _ABSOLUTE_GATE_LUFS]
+    if not len(gated):
+        return -math.inf
+    relative = -0.691 + 10 * math.log10(gated.mean()) + _RELATIVE_GATE_LU
+    gated = gated[-0.691 + 10 * np.log10(gated) > relative]
+    return -0.691 + 10 * math.log10(gated.mean())
+
+
+def normalization_gain(samples: np.ndarray, rate: int, target_lufs: float) -> float:
+    """Linear gain bringing samples to target_lufs, within the boost and peak limits."""
+    loudness = integrated_loudness(samples, rate)
+    if not math.isfinite(loudness):
+        return 1.0
+    gain_db = min(target_lufs - loudness, MAX_BOOST_DB)
+    peak = int(np.abs(samples.astype(np.int32)).max())
+    if peak:
+        gain_db = min(gain_db, PEAK_CEILING_DBFS - 20 * math.log10(peak / 32768.0))
+    return 10 ** (gain_db / 20)
+
+
+def normalize(samples: np.ndarray, rate: int, target_lufs: float) -> np.ndarray:
+    """Return 16-bit samples scaled to target_lufs (the input itself if already close)."""
+    if not len(samples):
+        return samples
+    gain = normalization_gain(samples, rate, target_lufs)
+    if abs(20 * math.log10(gain)) < MIN_GAIN_DB:
+        return samples
+    scaled = samples * np.float32(gain)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
+
+
+def _k_weighting(rate: int, block: int) -> np.ndarray:
+    """Squared magnitude of the BS.1770 K-weighting filter at the rfft bins of a block.
+
+    Both biquads (high shelf, then high-pass) are designed for `rate` from
+    their analog prototypes, which reproduces the standard's 48 kHz
+    coefficients exactly.
+    """
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass_b = [1.0, -2.0, 1.0]
+    highpass_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    z = np.exp(-1j * np.pi * np.arange(block // 2 + 1) / (block / 2))
+    response = np.ones(len(z))
+    for b, a in ((shelf_b, shelf_a), (highpass_b, highpass_a)):
+        response *= np.abs(np.polyval(b[::-1], z) / np.polyval(a[::-1], z)) ** 2
+
+    # Parseval weights for a one-sided spectrum
+    response[1:(block + 1) // 2] *= 2
+    return response.astype(np.float32)
@@ -0,0 +1,317 @@
+"""MPEG audio layer III frame parsing and writing for lossless MP3 concatenation.
+
+MP3 streams can be joined frame by frame without decoding as long as they
+share sample rate and channel count: every encoder starts a stream with an
+empty bit reservoir, so the first frame of each part never borrows bits from
+the part before it. Pauses are filled with silent frames encoded with the
+reservoir disabled, so any number of them can be repeated back to back.
+"""
+
+import io
+import logging
+import struct
+import threading
+from dataclasses import dataclass
+
+from pydub import AudioSegment
+
+logger = logging.getLogger(__name__)
+
+# Bitrates (kbps) by index for layer III: MPEG-1, then MPEG-2 / 2.5
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+# LAME's encoder delay, and the total offset between an encoder's input and the
+# decoded output of its raw frames (the decoder's filterbank adds 529 samples):
+# frame f of a stream starting at input sample 0 decodes samples
+# [f * samples_per_frame - STREAM_DELAY, (f + 1) * samples_per_frame - STREAM_DELAY)
+ENCODER_DELAY = 576
+STREAM_DELAY = ENCODER_DELAY + 529
+
+# Flags of the Xing header written in front of concatenated streams
+_XING_FRAMES, _XING_BYTES, _XING_TOC, _XING_QUALITY = 0x1, 0x2, 0x4, 0x8
+_LAME_TAG_SIZE = 36
+
+# ID3v2 text frames for the tag keys used across the app; others become TXXX
+_ID3_TEXT_FRAMES = {
+    "title": "TIT2",
+    "artist": "TPE1",
+    "album": "TALB",
+    "genre": "TCON",
+    "date": "TDRC",
+    "track": "TRCK",
+}
+
+
+@dataclass(frozen=True)
+class StreamFormat:
+    sample_rate: int
+    channels: int
+
+    @property
+    def mpeg1(self) -> bool:
+        return self.sample_rate >= 32000
+
+    @property
+    def samples_per_frame(self) -> int:
+        return 1152 if self.mpeg1 else 576
+
+
+@dataclass(frozen=True)
+class Frame:
+    offset: int
+    length: int
+    format: StreamFormat
+
+
+def parse_header(data: bytes, offset: int) -> Frame | None:
+    """Decode the 4-byte layer III header at offset, or None if it is not one."""
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x3
+    layer = (b1 >> 1) & 0x3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    bitrate = _BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    padding = (b2 >> 1) & 0x1
+    channels = 1 if (b3 >> 6) == 3 else 2
+    coefficient = 144 if version == 3 else 72
+    length = coefficient * bitrate // sample_rate + padding
+    return Frame(offset, length, StreamFormat(sample_rate, channels))
+
+
+def id3v2_size(data: bytes) -> int:
+    """Size of the ID3v2 tag at the start of data, 0 if there is none."""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    return 10 + _syncsafe_decode(data[6:10]) + (10 if data[5] & 0x10 else 0)
+
+
+def parse_frames(data: bytes) -> list[Frame]:
+    """Return the audio frames of an MP3 file.
+
+    Leading ID3v2 tags, a Xing/Info/VBRI header frame, trailing ID3v1 tags
+    and any truncated last frame are left out.
+    """
+    offset = id3v2_size(data)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+
+    frames: list[Frame] = []
+    while offset + 4 <= end:
+        frame = parse_header(data, offset)
+        if frame is None:
+            # Resynchronise on the next possible frame start
+            offset = data.find(b"\xff", offset + 1, end)
+            if offset < 0:
+                break
+            continue
+        if frame.offset + frame.length > end:
+            break
+        if not frames and _is_info_frame(data, frame):
+            offset += frame.length
+            continue
+        frames.append(frame)
+        offset += frame.length
+    return frames
+
+
+def _is_info_frame(data: bytes, frame: Frame) -> bool:
+    tag_at = frame.offset + 4 + _side_info_size(frame.format)
+    tag = data[tag_at:tag_at + 4]
+    return tag in (b"Xing", b"Info") or data[frame.offset + 36:frame.offset + 40] == b"VBRI"
+
+
+def _side_info_size(fmt: StreamFormat) -> int:
+    if fmt.mpeg1:
+        return 17 if fmt.channels == 1 else 32
+    return 9 if fmt.channels == 1 else 17
+
+
+_silence_cache: dict[StreamFormat, bytes] = {}
+_silence_lock = threading.Lock()
+
+
+def silent_frame(fmt: StreamFormat) -> bytes:
+    """One self-contained silent frame for fmt, encoded once per process."""
+    with _silence_lock:
+        frame = _silence_cache.get(fmt)
+        if frame is None:
+            frame = _encode_silent_frame(fmt)
+            _silence_cache[fmt] = frame
+        return frame
+
+
+def _encode_silent_frame(fmt: StreamFormat) -> bytes:
+    silence = AudioSegment.silent(duration=1000, frame_rate=fmt.sample_rate).set_channels(fmt.channels)
+    buffer = io.BytesIO()
+    silence.export(
+        buffer, format="mp3", codec="libmp3lame", bitrate="32k",
+        parameters=["-reservoir", "0", "-write_xing", "0"],
+    )
+    data = buffer.getvalue()
+    frames = parse_frames(data)
+    # The first and last frames carry encoder ramp-up/flush; take one from the middle
+    frame = frames[len(frames) // 2]
+    return data[frame.offset:frame.offset + frame.length]
+
+
+def encode_part(audio: AudioSegment, fmt: StreamFormat, reservoir: bool = True) -> bytes:
+    """Re-encode one piece of audio to MP3 frames matching fmt.
+
+    With reservoir=False no frame borrows bits from the one before it, so
+    the frames can be cut out and spliced anywhere.
+    """
+    audio = audio.set_frame_rate(fmt.sample_rate).set_channels(fmt.channels)
+    # MPEG-2 rates (below 32 kHz) top out at 160 kbps
+    if fmt.mpeg1:
+        bitrate = "192k"
+    else:
+        bitrate = "64k" if fmt.channels == 1 else "128k"
+    parameters = ["-write_xing", "0"]
+    if not reservoir:
+        parameters += ["-reservoir", "0"]
+    buffer = io.BytesIO()
+    audio.export(buffer, format="mp3", codec="libmp3lame", bitrate=bitrate, parameters=parameters)
+    return buffer.getvalue()
+
+
+def xing_frame(
+    fmt: StreamFormat,
+    frame_offsets: list[int],
+    total_bytes: int,
+    delay: int = 0,
+    padding: int = 0,
+) -> bytes:
+    """Build a Xing + LAME header frame describing the frames that follow it.
+
+    Args:
+        fmt: Format of the stream.
+        frame_offsets: Offset of every audio frame, relative to the start
+            of the Xing frame.
+        total_bytes: Size of the stream including the Xing frame.
+        delay: Encoder delay for gapless decoders to trim from the start
+            (ENCODER_DELAY for a single encode; 0 for joined parts).
+        padding: Samples of the last frame past the end of the audio.
+    """
+    side_info = _side_info_size(fmt)
+    needed = 4 + side_info + 8 + 4 + 4 + 100 + 4 + _LAME_TAG_SIZE
+    header, length = _header_with_room(fmt, needed)
+
+    frame_count = len(frame_offsets)
+    toc = bytearray(100)
+    for i in range(100):
+        index = min(frame_count - 1, i * frame_count // 100) if frame_count else 0
+        position = frame_offsets[index] if frame_count else 0
+        toc[i] = min(255, position * 256 // max(total_bytes, 1))
+
+    body = bytearray(header + bytes(side_info))
+    body += b"Xing" + struct.pack(">I", _XING_FRAMES | _XING_BYTES | _XING_TOC | _XING_QUALITY)
+    body += struct.pack(">II", frame_count, total_bytes) + toc + struct.pack(">I", 0)
+    body += _lame_tag(body, total_bytes, delay, padding)
+    body += bytes(length - len(body))
+    return bytes(body)
+
+
+def _header_with_room(fmt: StreamFormat, needed: int) -> tuple[bytes, int]:
+    """Smallest-bitrate frame header for fmt whose frame holds `needed` bytes."""
+    version = 3 if fmt.mpeg1 else (2 if fmt.sample_rate >= 16000 else 0)
+    rate_index = _SAMPLE_RATES[version].index(fmt.sample_rate)
+    bitrates = _BITRATES[1 if version == 3 else 2]
+    coefficient = 144 if version == 3 else 72
+    for bitrate_index in range(1, 15):
+        length = coefficient * bitrates[bitrate_index] * 1000 // fmt.sample_rate
+        if length >= needed:
+            break
+    channel_mode = 3 if fmt.channels == 1 else 1  # mono, or joint stereo
+    header = bytes([
+        0xFF,
+        0xE0 | (version << 3) | (1 << 1) | 1,  # layer III, no CRC
+        (bitrate_index << 4) | (rate_index << 2),
+        channel_mode << 6,
+    ])
+    return header, length
+
+
+def _lame_tag(xing: bytes, total_bytes: int, delay: int, padding: int) -> bytes:
+    """LAME extension: encoder id, delay/padding to trim, and its CRC.
+
+    The CRC covers everything in the frame before it (190 bytes for a
+    standard Xing layout).
+    """
+    tag = bytearray(b"LAME3.100")
+    tag += bytes([0x00, 0x00])  # revision / VBR method, lowpass
+    tag += bytes(8)  # replay gain
+    tag += bytes([0x00, 0x00])  # encoding flags / ATH, bitrate
+    tag += bytes([delay >> 4, ((delay & 0xF) << 4) | (padding >> 8), padding & 0xFF])  # 12 bits each
+    tag += bytes([0x00, 0x00]) + bytes(2)  # misc, mp3 gain, preset / surround
+    tag += struct.pack(">I", total_bytes) + bytes(2)  # music length, music CRC (not computed)
+    tag += struct.pack(">H", _crc16(bytes(xing) + bytes(tag)))
+    return bytes(tag)
+
+
+def _crc16(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def id3v2_tag(tags: dict | None, chapters: list[tuple[str, int, int]] | None = None) -> bytes:
+    """Serialize tags as an ID3v2.4 tag with UTF-8 text frames.
+
+    chapters, as (title, start_ms, end_ms), become CHAP frames listed in
+    order by a top-level CTOC frame (which holds at most 255).
+    """
+    frames = b""
+    for key, value in (tags or {}).items():
+        frame_id = _ID3_TEXT_FRAMES.get(key)
+        if frame_id:
+            payload = b"\x03" + str(value).encode("utf-8")
+        else:
+            frame_id = "TXXX"
+            payload = b"\x03" + key.encode("utf-8") + b"\x00" + str(value).encode("utf-8")
+        frames += id3v2_frame(frame_id, payload)
+    if chapters:
+        chapters = chapters[:255]
+        element_ids = [f"chp{i}".encode("ascii") for i in range(len(chapters))]
+        # Flags: top-level, ordered
+        toc = b"toc\x00" + bytes([0x03, len(chapters)]) + b"".join(eid + b"\x00" for eid in element_ids)
+        frames += id3v2_frame("CTOC", toc)
+        for eid, (title, start_ms, end_ms) in zip(element_ids, chapters):
+            # Byte offsets unset (0xFFFFFFFF): players seek by time
+            payload = eid + b"\x00" + struct.pack(">IIII", start_ms, end_ms, 0xFFFFFFFF, 0xFFFFFFFF)
+            payload += id3v2_frame("TIT2", b"\x03" + title.encode("utf-8"))
+            frames += id3v2_frame("CHAP", payload)
+    return id3v2_header(len(frames)) + frames
+
+
+def id3v2_header(size: int) -> bytes:
+    return b"ID3\x04\x00\x00" + _syncsafe_encode(size)
+
+
+def id3v2_frame(frame_id: str, payload: bytes) -> bytes:
+    return frame_id.encode("ascii") + _syncsafe_encode(len(payload)) + b"\x00\x00" + payload
+
+
+def _syncsafe_encode(value: int) -> bytes:
+    return bytes([(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F])
+
+
+def _syncsafe_decode(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
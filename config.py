@@ -15,10 +15,86 @@ COVER_STYLE = "vivid"
 
 # TTS (OpenAI)
 TTS_MODEL = "gpt-4o-mini-tts"
-TTS_RESPONSE_FORMAT = "mp3"
+# "pcm" is raw 16-bit mono at TTS_PCM_SAMPLE_RATE: no per-segment decode, and the
+# story is lossy-encoded exactly once at assembly. Set to "mp3" to trade that for
+# smaller spool/cache files.
+TTS_RESPONSE_FORMAT = os.getenv("TTS_RESPONSE_FORMAT", "pcm")
+TTS_PCM_SAMPLE_RATE = 24000
 TTS_SPEED = 1.15  # Speed multiplier (0.25 to 4.0, 1.0 is default)
+# On-disk cache of synthesized segments under STORAGE_DIR/tts_cache (0 disables it)
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024
+# TTS latency is taken per character, with requests shorter than this counted
+# as this long: time to first byte dominates short lines (see tts.latency)
+TTS_LATENCY_MIN_CHARS = 200
+# Hedged TTS requests: when a request runs longer than this percentile of recent
+# latencies, a duplicate is sent and the first to finish wins. Duplicates are
+# capped at TTS_HEDGE_MAX_FRACTION of all requests.
+TTS_HEDGE_ENABLED = os.getenv("TTS_HEDGE_ENABLED", "0") == "1"
+TTS_HEDGE_PERCENTILE = 0.95
+TTS_HEDGE_MAX_FRACTION = 0.05
+TTS_HEDGE_MIN_SAMPLES = 20
+# TTS model routing: a model whose p90 latency per character or error rate
+# over the last TTS_ROUTE_WINDOW_S breaches these limits is routed around,
+# with one probe request every TTS_ROUTE_PROBE_INTERVAL_S to detect recovery
+TTS_ROUTE_SLO_MS_PER_CHAR = 60
+TTS_ROUTE_MAX_ERROR_RATE = 0.25
+TTS_ROUTE_WINDOW_S = 300
+TTS_ROUTE_PROBE_INTERVAL_S = 30
+# Segments longer than this are split at sentence boundaries and the pieces
+# synthesized in parallel (0 disables), then rejoined with a short gap
+TTS_SPLIT_MAX_CHARS = 400
+TTS_SPLIT_GAP_MS = 120
+# Adaptive TTS concurrency: upper bound of the in-flight window, and how much
+# slower than the healthy per-character latency a request must be to back off
+TTS_AIMD_MAX_CONCURRENCY = 16
+TTS_AIMD_LATENCY_FACTOR = 2.5
+# Character cap of one request when adjacent same-voice segments are coalesced
+TTS_COALESCE_MAX_CHARS = 1500
+# Background TTS requests shared by all drafts being speculatively synthesized
+SPECULATIVE_TTS_WORKERS = 2
+# Processes applying voice effects to recordings while the user reviews a draft
+VOICE_EFFECT_WORKERS = int(os.getenv("VOICE_EFFECT_WORKERS", "2"))
+
+# Provider rate limits, shared by every worker thread and process using STORAGE_DIR.
+# (provider, model) -> (requests per minute, units per minute); units are input
+# characters for TTS and tokens for LLMs, None leaves that bucket unlimited.
+# Conservative tier-1 defaults — raise them to match the account's quota.
+PROVIDER_RATE_LIMITS = {
+    ("openai", "gpt-4o-mini-tts"): (500, 200_000),
+    ("openai", "tts-1"): (500, 200_000),
+    ("openai", "tts-1-hd"): (500, 200_000),
+    ("openai", "gpt-4o"): (500, 30_000),
+    ("openai", "gpt-4o-mini"): (500, 200_000),
+    ("openai", "gpt-4.1"): (500, 30_000),
+    ("openai", "gpt-4.1-mini"): (500, 200_000),
+    ("openai", "dall-e-3"): (50, None),
+    ("google", "imagen-3.0-generate-002"): (20, None),
+    ("google", "lyria-002"): (10, None),
+}
+RATE_LIMIT_MAX_ATTEMPTS = 5
+RATE_LIMIT_BACKOFF_BASE_S = 1.0
+RATE_LIMIT_BACKOFF_MAX_S = 30.0
 
 # Audio
+# How stories are assembled and mixed: "buffer" builds the whole story in one
+# in-memory PCM buffer; "stream" feeds a long-lived ffmpeg encoder segment by
+# segment, so memory stays at about one segment however long the story is;
+# "frames" joins MP3 segments (TTS_RESPONSE_FORMAT = "mp3") frame by frame
+# without re-encoding them
+AUDIO_ASSEMBLY_MODE = os.getenv("AUDIO_ASSEMBLY_MODE", "buffer")
+# While a new story is synthesized, its finished prefix is published as an HLS
+# playlist of MP3 chunks this long, so it can be played early (0 disables)
+AUDIO_PROGRESSIVE_CHUNK_S = int(os.getenv("AUDIO_PROGRESSIVE_CHUNK_S", "10"))
+# Each segment (TTS voice or user recording) is scaled to this integrated
+# loudness as the story is assembled, so levels match across sources
+AUDIO_LOUDNESS_NORMALIZE = os.getenv("AUDIO_LOUDNESS_NORMALIZE", "1") == "1"
+AUDIO_LOUDNESS_TARGET_LUFS = float(os.getenv("AUDIO_LOUDNESS_TARGET_LUFS", "-18"))
+# Small Opus rendition encoded next to the MP3 master and used for in-app playback
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "40k")
+# BGM loop library: each mood keeps up to BGM_POOL_SIZE generated loops and is
+# refilled in the background when it falls below BGM_POOL_REFILL_BELOW
+BGM_POOL_SIZE = 4
+BGM_POOL_REFILL_BELOW = 2
 DEFAULT_PAUSE_MS = 400
 SEGMENT_PAUSE_MS = 200
 
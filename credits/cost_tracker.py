@@ -7,7 +7,7 @@ from credits.pricing import (
     LLM_PRICING,
     TTS_PRICING,
 )
-from db.models import Story
+from db.models import Story, SystemCost
 
 
 def estimate_story_generation_cost(
@@ -32,6 +32,14 @@ def estimate_tts_cost(total_chars: int, model: str = "gpt-4o-mini-tts") -> float
     return (total_chars / 1_000_000) * rate
 
 
+def estimate_segments_tts_cost(segments: list[dict], default_model: str = "gpt-4o-mini-tts") -> float:
+    """TTS cost of synthesized segments, priced by the model each one actually used."""
+    return sum(
+        estimate_tts_cost(seg.get("tts_chars", 0), model=seg.get("model") or default_model)
+        for seg in segments
+    )
+
+
 def record_costs(
     db: Session,
     story_id: str,
@@ -55,3 +63,9 @@ def record_costs(
     story.segment_count = segment_count
     story.total_tts_chars = total_tts_chars
     db.commit()
+
+
+def record_system_cost(db: Session, kind: str, cost: float, description: str = ""):
+    """Record spend that belongs to no story, so it shows up without billing a user."""
+    db.add(SystemCost(kind=kind, cost_usd=round(cost, 6), description=description))
+    db.commit()
@@ -60,6 +60,9 @@ def run_migrations():
                 "total_tts_chars": "INTEGER DEFAULT 0",
                 "bgm_path": "VARCHAR(500)",
                 "user_recordings": "TEXT",
+                "segment_manifest": "TEXT",
+                "audio_renditions": "TEXT",
+                "segment_index": "TEXT",
             }
             for col_name, col_type in story_columns.items():
                 if not _column_exists(inspector, "stories", col_name):
@@ -96,6 +99,11 @@ def run_migrations():
                     bgm_provider VARCHAR(50) NOT NULL DEFAULT 'none',
                     story_model VARCHAR(100) NOT NULL DEFAULT 'gpt-4o',
                     tts_model VARCHAR(100) NOT NULL DEFAULT 'gpt-4o-mini-tts',
+                    tts_concurrency INTEGER NOT NULL DEFAULT 4,
+                    tts_coalesce BOOLEAN NOT NULL DEFAULT 0,
+                    tts_speculative BOOLEAN NOT NULL DEFAULT 0,
+                    tts_adaptive_concurrency BOOLEAN NOT NULL DEFAULT 0,
+                    tts_fallback_model VARCHAR(50) NOT NULL DEFAULT 'none',
                     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """))
@@ -108,6 +116,11 @@ def run_migrations():
             settings_columns = {
                 "bgm_enabled": "BOOLEAN NOT NULL DEFAULT 0",
                 "bgm_provider": "VARCHAR(50) NOT NULL DEFAULT 'none'",
+                "tts_concurrency": "INTEGER NOT NULL DEFAULT 4",
+                "tts_coalesce": "BOOLEAN NOT NULL DEFAULT 0",
+                "tts_speculative": "BOOLEAN NOT NULL DEFAULT 0",
+                "tts_adaptive_concurrency": "BOOLEAN NOT NULL DEFAULT 0",
+                "tts_fallback_model": "VARCHAR(50) NOT NULL DEFAULT 'none'",
             }
             for col_name, col_type in settings_columns.items():
                 if not _column_exists(inspector, "app_settings", col_name):
@@ -131,4 +144,17 @@ def run_migrations():
             ))
             logger.info("Created login_attempts table")
 
+        # --- System Costs table ---
+        if not _table_exists(inspector, "system_costs"):
+            conn.execute(text("""
+                CREATE TABLE system_costs (
+                    id VARCHAR(36) PRIMARY KEY,
+                    kind VARCHAR(50) NOT NULL,
+                    cost_usd FLOAT DEFAULT 0.0,
+                    description VARCHAR(500),
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            logger.info("Created system_costs table")
+
     logger.info("Migrations complete")
@@ -79,6 +79,10 @@ class Story(Base):
     summary = Column(Text)
     cover_image_path = Column(String(500))
     audio_path = Column(String(500))
+    # {name: {"path", "mime", "bytes"}} for every encoding of the story, MP3 master included
+    audio_renditions = Column(JSONField, nullable=True)
+    # Segment positions in the MP3 master (see audio.assembler.assemble_audio), for splicing
+    segment_index = Column(JSONField, nullable=True)
     duration_seconds = Column(Float)
     status = Column(String(20), default="generating", nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -98,6 +102,8 @@ class Story(Base):
     segment_count = Column(Integer, default=0)
     total_tts_chars = Column(Integer, default=0)
     user_recordings = Column(JSONField, nullable=True)
+    # {segment_id: {"audio_path", "format", "fingerprint"}} for incremental re-renders
+    segment_manifest = Column(JSONField, nullable=True)
 
     user = relationship("User", back_populates="stories")
     transactions = relationship("Transaction", back_populates="story")
@@ -130,6 +136,17 @@ class LoginAttempt(Base):
     success = Column(Boolean, nullable=False)
 
 
+class SystemCost(Base):
+    """Provider spend not attributable to a story (e.g. background BGM pool refills)."""
+    __tablename__ = "system_costs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = Column(String(50), nullable=False)  # e.g. "bgm_pool"
+    cost_usd = Column(Float, default=0.0)
+    description = Column(String(500))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 class AppSettings(Base):
     """Singleton settings table — always exactly one row with id='default'."""
     __tablename__ = "app_settings"
@@ -140,6 +157,11 @@ class AppSettings(Base):
     bgm_provider = Column(String(50), default="none", nullable=False, server_default="none")
     story_model = Column(String(100), default="gpt-4o", nullable=False, server_default="gpt-4o")
     tts_model = Column(String(100), default="gpt-4o-mini-tts", nullable=False, server_default="gpt-4o-mini-tts")
+    tts_concurrency = Column(Integer, default=4, nullable=False, server_default="4")
+    tts_coalesce = Column(Boolean, default=False, nullable=False, server_default="0")
+    tts_speculative = Column(Boolean, default=False, nullable=False, server_default="0")
+    tts_adaptive_concurrency = Column(Boolean, default=False, nullable=False, server_default="0")
+    tts_fallback_model = Column(String(50), default="none", nullable=False, server_default="none")
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(timezone.utc),
@@ -20,7 +20,8 @@ def update_settings(db: Session, **kwargs) -> AppSettings:
     settings = get_settings(db)
     allowed = {
         "image_provider", "bgm_enabled", "bgm_provider",
-        "story_model", "tts_model",
+        "story_model", "tts_model", "tts_concurrency", "tts_coalesce",
+        "tts_speculative", "tts_adaptive_concurrency", "tts_fallback_model",
     }
     for key, value in kwargs.items():
         if key in allowed:
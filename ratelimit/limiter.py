@@ -0,0 +1,224 @@
+"""Shared token-bucket rate limiting and 429-aware retries for provider API calls.
+
+Each (provider, model) pair gets a requests-per-minute bucket and an optional
+units-per-minute bucket (characters for TTS, tokens for LLMs). Bucket state
+lives in a small JSON file under STORAGE_DIR/ratelimit that is updated under
+an exclusive file lock, so every thread and every worker process sharing the
+storage volume draws from the same quota.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, TypeVar
+
+import openai
+import requests
+
+from config import (
+    PROVIDER_RATE_LIMITS,
+    RATE_LIMIT_BACKOFF_BASE_S,
+    RATE_LIMIT_BACKOFF_MAX_S,
+    RATE_LIMIT_MAX_ATTEMPTS,
+    STORAGE_DIR,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_STATE_DIR = os.path.join(STORAGE_DIR, "ratelimit")
+_thread_locks: dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+# Longest single sleep while waiting for tokens, so penalties set by other
+# processes are noticed promptly
+_MAX_POLL_S = 2.0
+
+
+class RateLimitTimeout(Exception):
+    """Raised when tokens could not be acquired within the requested timeout."""
+
+
+def _state_key(provider: str, model: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", f"{provider}__{model}")
+
+
+def _thread_lock(key: str) -> threading.Lock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(key, threading.Lock())
+
+
+@contextmanager
+def _locked_state(key: str):
+    """Yield the mutable bucket state for key, persisted when the block exits."""
+    os.makedirs(_STATE_DIR, exist_ok=True)
+    path = os.path.join(_STATE_DIR, f"{key}.json")
+    with _thread_lock(key), open(path, "a+", encoding="utf-8") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            raw = f.read()
+            try:
+                state = json.loads(raw) if raw else {}
+            except ValueError:
+                state = {}
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _refill(state: dict, name: str, per_minute: int, now: float) -> float:
+    """Top up one bucket for the elapsed time and return its current level."""
+    level = state.get(f"{name}_tokens", float(per_minute))
+    updated = state.get(f"{name}_updated", now)
+    level = min(float(per_minute), level + (now - updated) * per_minute / 60.0)
+    state[f"{name}_tokens"] = level
+    state[f"{name}_updated"] = now
+    return level
+
+
+def acquire(provider: str, model: str, units: int = 0, timeout: float | None = None):
+    """Block until one request (and `units` characters/tokens) fits the quota.
+
+    Pairs without an entry in PROVIDER_RATE_LIMITS are not throttled.
+    """
+    limits = PROVIDER_RATE_LIMITS.get((provider, model))
+    if not limits:
+        return
+    rpm, upm = limits
+    # A single call larger than the whole bucket would otherwise wait forever
+    units = min(units, upm) if upm else 0
+    key = _state_key(provider, model)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    while True:
+        with _locked_state(key) as state:
+            now = time.time()
+            wait = state.get("blocked_until", 0.0) - now
+            if wait <= 0:
+                requests_left = _refill(state, "requests", rpm, now)
+                units_left = _refill(state, "units", upm, now) if upm else 0.0
+                wait = (1.0 - requests_left) * 60.0 / rpm
+                if upm:
+                    wait = max(wait, (units - units_left) * 60.0 / upm)
+                if wait <= 0:
+                    state["requests_tokens"] = requests_left - 1.0
+                    if upm:
+                        state["units_tokens"] = units_left - units
+                    return
+
+        if deadline is not None and time.monotonic() + wait > deadline:
+            raise RateLimitTimeout(f"Rate limit for {provider}/{model} not available in time")
+        time.sleep(min(wait, _MAX_POLL_S))
+
+
+def penalize(provider: str, model: str, seconds: float):
+    """Pause every caller of (provider, model) for `seconds`, e.g. after a 429."""
+    with _locked_state(_state_key(provider, model)) as state:
+        state["blocked_until"] = max(state.get("blocked_until", 0.0), time.time() + seconds)
+
+
+def _status_code(exc: Exception) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int):
+        status = exc.code  # google-genai APIError
+    return status
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return isinstance(exc, (
+        openai.APIConnectionError,  # includes APITimeoutError
+        requests.ConnectionError,
+        requests.Timeout,
+        TimeoutError,
+    ))
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Return the server-requested delay in seconds, if the error carries one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000.0
+        except ValueError:
+            pass
+    retry = headers.get("retry-after")
+    if not retry:
+        return None
+    try:
+        return float(retry)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (0-based) attempt."""
+    ceiling = min(RATE_LIMIT_BACKOFF_MAX_S, RATE_LIMIT_BACKOFF_BASE_S * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    provider: str,
+    model: str,
+    units: int = 0,
+    max_attempts: int = RATE_LIMIT_MAX_ATTEMPTS,
+) -> T:
+    """Run fn() under the shared rate limit, retrying throttling and transient errors.
+
+    Delays honour the provider's Retry-After header when present and fall back
+    to jittered exponential backoff; a 429 also pauses every other caller of
+    the same model for that long.
+    Non-retryable errors and the last failed attempt are re-raised.
+    """
+    attempt = 0
+    while True:
+        acquire(provider, model, units)
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt >= max_attempts or not _is_retryable(e):
+                raise
+            status = _status_code(e)
+            delay = _retry_after(e)
+            if delay is None:
+                delay = _backoff(attempt - 1)
+            delay = min(delay, RATE_LIMIT_BACKOFF_MAX_S * 4)
+            if status == 429:
+                penalize(provider, model, delay)
+            logger.warning(
+                "%s/%s call failed (attempt %d/%d, status=%s), retrying in %.1fs: %s",
+                provider, model, attempt, max_attempts, status, delay, e,
+            )
+            time.sleep(delay)
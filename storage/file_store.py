@@ -1,5 +1,6 @@
 import logging
 import os
+import shutil
 
 import requests
 
@@ -38,6 +39,28 @@ def get_audio_path(story_id: str) -> str | None:
     return path if os.path.exists(path) else None
 
 
+def get_progressive_dir(story_id: str) -> str:
+    """Directory of the audio chunks published while a story is still being synthesized."""
+    return os.path.join(STORAGE_DIR, "audio", "progressive", story_id)
+
+
+def read_published_audio(story_id: str) -> bytes | None:
+    """Concatenate the chunks listed so far in a story's progressive playlist."""
+    progressive_dir = get_progressive_dir(story_id)
+    try:
+        with open(os.path.join(progressive_dir, "index.m3u8")) as f:
+            chunks = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    except OSError:
+        return None
+    data = b""
+    for chunk in chunks:
+        chunk_bytes = read_file_bytes(os.path.join(progressive_dir, chunk))
+        if chunk_bytes is None:
+            break
+        data += chunk_bytes
+    return data or None
+
+
 def get_cover_path(story_id: str) -> str | None:
     """Return the cover image path if it exists."""
     path = os.path.join(STORAGE_DIR, "covers", f"{story_id}.png")
@@ -54,6 +77,15 @@ def save_recording(story_id: str, segment_id: int, audio_bytes: bytes) -> str:
     return file_path
 
 
+def copy_recording(story_id: str, segment_id: int, source_path: str) -> str:
+    """Copy an already processed recording into a story's recordings and return the path."""
+    rec_dir = _ensure_dir(os.path.join("recordings", story_id))
+    file_path = os.path.join(rec_dir, f"{segment_id}.wav")
+    shutil.copyfile(source_path, file_path)
+    logger.info("Saved recording: %s", file_path)
+    return file_path
+
+
 def read_file_bytes(path: str) -> bytes | None:
     """Read a file and return its bytes, or None if not found."""
     if path and os.path.exists(path):
@@ -11,6 +11,7 @@ from config import (
     COVER_STYLE,
     STORAGE_DIR,
 )
+from ratelimit.limiter import call_with_retry
 
 logger = logging.getLogger(__name__)
 
@@ -48,15 +49,18 @@ def _generate_dalle3(summary: str, title: str) -> str:
     """Generate via OpenAI DALL-E 3. Returns image URL."""
     from openai import OpenAI
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
     prompt = _build_prompt(summary)
 
-    response = client.images.generate(
-        model=COVER_MODEL,
-        prompt=prompt,
-        size=COVER_SIZE,
-        style=COVER_STYLE,
-        n=1,
+    response = call_with_retry(
+        lambda: client.images.generate(
+            model=COVER_MODEL,
+            prompt=prompt,
+            size=COVER_SIZE,
+            style=COVER_STYLE,
+            n=1,
+        ),
+        "openai", COVER_MODEL,
     )
 
     image_url = response.data[0].url
@@ -72,15 +76,19 @@ def _generate_imagen3(summary: str, title: str) -> str:
     client = get_google_client()
     prompt = _build_prompt(summary)
 
-    response = client.models.generate_images(
-        model="imagen-3.0-generate-002",
-        prompt=prompt,
-        config=types.GenerateImagesConfig(
-            number_of_images=1,
-            aspect_ratio="1:1",
-            safety_filter_level="BLOCK_ONLY_HIGH",
-            negative_prompt="text, letters, words, title, writing, typography, captions, watermark",
+    model = "imagen-3.0-generate-002"
+    response = call_with_retry(
+        lambda: client.models.generate_images(
+            model=model,
+            prompt=prompt,
+            config=types.GenerateImagesConfig(
+                number_of_images=1,
+                aspect_ratio="1:1",
+                safety_filter_level="BLOCK_ONLY_HIGH",
+                negative_prompt="text, letters, words, title, writing, typography, captions, watermark",
+            ),
         ),
+        "google", model,
     )
 
     if not response.generated_images:
@@ -4,6 +4,7 @@ import logging
 from openai import OpenAI
 
 from config import OPENAI_API_KEY, STORY_MODEL, EMOTIONS
+from ratelimit.limiter import call_with_retry
 from story.schema import StructuredStory
 
 LANGUAGE_NAMES = {
@@ -15,7 +16,10 @@ LANGUAGE_NAMES = {
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Retries are handled by ratelimit.limiter so they share the process-wide quota
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+MAX_COMPLETION_TOKENS = 4096
 
 SYSTEM_PROMPT = """\
 You are a world-class children's story writer. You create vivid, age-appropriate stories \
@@ -90,15 +94,22 @@ def generate_story(
 
     model = model_override or STORY_MODEL
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        response_format={"type": "json_object"},
-        temperature=0.9,
-        max_tokens=4096,
+    # Rough token estimate (~4 chars/token) plus the completion budget, as the
+    # provider counts max_tokens against the per-minute token quota
+    estimated_tokens = (len(SYSTEM_PROMPT) + len(user_prompt)) // 4 + MAX_COMPLETION_TOKENS
+
+    response = call_with_retry(
+        lambda: client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.9,
+            max_tokens=MAX_COMPLETION_TOKENS,
+        ),
+        "openai", model, units=estimated_tokens,
     )
 
     raw = response.choices[0].message.content
@@ -0,0 +1,138 @@
+"""Content-addressed on-disk cache for synthesized TTS segments."""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(text: str, voice: str, instructions: str, model: str, speed: float, fmt: str) -> str:
+    """Return a stable hash of every input that affects the synthesized audio."""
+    payload = json.dumps([text, voice, instructions, model, speed, fmt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Size-capped LRU cache of audio blobs, one file per key.
+
+    Recency is tracked through file mtimes (bumped on every hit), so the
+    cache survives restarts and can be shared by several worker processes
+    pointing at the same STORAGE_DIR.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get_file(self, key: str, dest_path: str) -> bool:
+        """Materialise the cached audio for key at dest_path. Returns False on a miss."""
+        if not self.enabled:
+            return False
+        path = self._path(key)
+        try:
+            _link_or_copy(path, dest_path)
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put_file(self, key: str, src_path: str):
+        """Store the audio file at src_path under key without reading it into memory."""
+        if not self.enabled:
+            return
+        try:
+            size = os.path.getsize(src_path)
+        except OSError:
+            return
+        if not size:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            _link_or_copy(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write TTS cache entry %s: %s", key, e)
+            return
+        self._account(size)
+
+    def _account(self, added: int):
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size_bytes": self._size}
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop the oldest entries until the cache is back under 90% of its cap."""
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            removed += 1
+        self._size = size
+        logger.info("Evicted %d TTS cache entries (%d bytes remain)", removed, size)
+
+
+def _link_or_copy(src: str, dest: str):
+    """Hard-link src to dest (cheap, same filesystem) and fall back to a copy."""
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        if not os.path.exists(src):
+            raise
+        shutil.copyfile(src, dest)
@@ -0,0 +1,105 @@
+"""Merge runs of same-voice segments into one TTS request and split the audio back.
+
+Adjacent segments that resolve to the same (voice, instructions) pair are sent
+as a single request with paragraph breaks between them, which the TTS model
+renders as short pauses. The returned audio is cut back into per-segment
+pieces at the silences closest to where each boundary is expected, so every
+segment keeps its own pause_after_ms in assembly.
+"""
+
+import logging
+
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+
+from story.schema import Segment
+
+logger = logging.getLogger(__name__)
+
+# Inserted between merged segment texts; read as a paragraph break (a pause)
+SEPARATOR = "\n\n"
+
+# Silence detection tuning for recovering boundaries
+_MIN_SILENCE_MS = 120
+_SILENCE_THRESH_DB = 16  # below the clip's average loudness
+_SEEK_STEP_MS = 10
+# A boundary silence must lie within this fraction of the clip of its expected spot
+_MAX_DRIFT = 0.2
+# Silence kept at the edges of each recovered piece so words are not clipped
+_EDGE_PAD_MS = 40
+
+
+def plan_groups(
+    segments: list[Segment],
+    voice_keys: dict[int, tuple[str, str] | None],
+    max_chars: int,
+) -> list[list[Segment]]:
+    """Group consecutive segments sharing a voice key, up to max_chars per group.
+
+    Segments whose key is None (e.g. user recordings) always stay on their own.
+    """
+    groups: list[list[Segment]] = []
+    group_key = None
+    group_chars = 0
+    for segment in segments:
+        key = voice_keys.get(segment.segment_id)
+        fits = group_chars + len(SEPARATOR) + len(segment.text) <= max_chars
+        if key is not None and key == group_key and fits:
+            groups[-1].append(segment)
+            group_chars += len(SEPARATOR) + len(segment.text)
+            continue
+        groups.append([segment])
+        group_key = key
+        group_chars = len(segment.text)
+    return groups
+
+
+def merged_text(group: list[Segment]) -> str:
+    return SEPARATOR.join(segment.text for segment in group)
+
+
+def split_audio(audio: AudioSegment, texts: list[str]) -> list[AudioSegment] | None:
+    """Cut merged audio into one piece per text, or return None if unsure.
+
+    Each boundary is expected at a position proportional to the characters
+    spoken before it; the nearest detected silence (in order, within
+    _MAX_DRIFT of the clip length) is taken as the cut.
+    """
+    if len(texts) == 1:
+        return [audio]
+
+    duration = len(audio)
+    silences = detect_silence(
+        audio,
+        min_silence_len=_MIN_SILENCE_MS,
+        silence_thresh=audio.dBFS - _SILENCE_THRESH_DB,
+        seek_step=_SEEK_STEP_MS,
+    )
+    # Leading/trailing silence can never be a boundary between two segments
+    silences = [(start, end) for start, end in silences if start > 0 and end < duration]
+
+    total_chars = sum(len(text) for text in texts)
+    cuts = []
+    spoken = 0
+    search_from = 0
+    for text in texts[:-1]:
+        spoken += len(text)
+        expected = duration * spoken / total_chars
+        best = None
+        for idx in range(search_from, len(silences)):
+            start, end = silences[idx]
+            drift = abs((start + end) / 2 - expected)
+            if drift <= _MAX_DRIFT * duration and (best is None or drift < best[0]):
+                best = (drift, idx)
+        if best is None:
+            return None
+        cuts.append(silences[best[1]])
+        search_from = best[1] + 1
+
+    pieces = []
+    piece_start = 0
+    for start, end in cuts:
+        pieces.append(audio[piece_start:min(start + _EDGE_PAD_MS, end)])
+        piece_start = max(end - _EDGE_PAD_MS, start)
+    pieces.append(audio[piece_start:])
+    return pieces
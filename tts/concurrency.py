@@ -0,0 +1,166 @@
+"""Adaptive (AIMD) concurrency control for TTS requests."""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import TTS_AIMD_LATENCY_FACTOR, TTS_AIMD_MAX_CONCURRENCY, TTS_LATENCY_MIN_CHARS
+from tts.latency import latency_per_char
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the healthy-latency baseline
+_BASELINE_ALPHA = 0.1
+# Samples needed before latency spikes are acted upon
+_BASELINE_MIN_SAMPLES = 5
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    Each successful request grows the window by 1/window (about +1 per full
+    window of successes). A 429, a timeout or a latency spike cuts it by
+    `backoff`, at most once per congestion event: requests that started
+    before the last cut cannot cut it again. Latency is compared per
+    character against an EWMA of healthy requests, so long segments do not
+    read as spikes; requests shorter than TTS_LATENCY_MIN_CHARS, whose time
+    is mostly time to first byte, are left out of both.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_window: int = 1,
+        max_window: int = TTS_AIMD_MAX_CONCURRENCY,
+        backoff: float = 0.5,
+        latency_factor: float = TTS_AIMD_LATENCY_FACTOR,
+        history: int = 50,
+    ):
+        self.name = name
+        self.min_window = min_window
+        self.max_window = max_window
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self._window = float(min(max(initial, min_window), max_window))
+        self._in_flight = 0
+        self._baseline: float | None = None
+        self._samples = 0
+        self._last_decrease = 0.0
+        self._decisions: deque[dict] = deque(maxlen=history)
+        self._cond = threading.Condition()
+
+    @property
+    def window(self) -> int:
+        return int(self._window)
+
+    @contextmanager
+    def slot(self, units: int = 1):
+        """Hold one in-flight slot for the duration of a request of `units` characters."""
+        with self._cond:
+            while self._in_flight >= int(self._window):
+                self._cond.wait()
+            self._in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._release()
+            reason = _congestion_reason(e)
+            if reason:
+                self._decrease(started, reason)
+            raise
+        self._release()
+        self._on_success(started, time.monotonic() - started, units)
+
+    def snapshot(self) -> dict:
+        """Current window, in-flight count and recent decisions, newest last."""
+        with self._cond:
+            return {
+                "name": self.name,
+                "window": int(self._window),
+                "in_flight": self._in_flight,
+                "baseline_ms_per_char": round(self._baseline * 1000, 2) if self._baseline else None,
+                "decisions": list(self._decisions),
+            }
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def _on_success(self, started: float, seconds: float, units: int):
+        per_unit = latency_per_char(seconds, units)
+        measured = units >= TTS_LATENCY_MIN_CHARS
+        with self._cond:
+            spiking = (
+                measured
+                and self._samples >= _BASELINE_MIN_SAMPLES
+                and per_unit > self.latency_factor * self._baseline
+            )
+            if not spiking:
+                if measured:
+                    self._samples += 1
+                    self._baseline = (
+                        per_unit if self._baseline is None
+                        else (1 - _BASELINE_ALPHA) * self._baseline + _BASELINE_ALPHA * per_unit
+                    )
+                before = int(self._window)
+                self._window = min(self.max_window, self._window + 1 / self._window)
+                if int(self._window) > before:
+                    self._record("increase", "healthy")
+                    self._cond.notify()
+                return
+        self._decrease(started, "latency")
+
+    def _decrease(self, started: float, reason: str):
+        with self._cond:
+            if started < self._last_decrease:
+                return
+            self._last_decrease = time.monotonic()
+            self._window = max(self.min_window, self._window * self.backoff)
+            self._record("decrease", reason)
+
+    def _record(self, action: str, reason: str):
+        self._decisions.append({
+            "time": time.strftime("%H:%M:%S"),
+            "action": action,
+            "reason": reason,
+            "window": int(self._window),
+        })
+        logger.info("TTS concurrency %s (%s): %s window=%d", action, reason, self.name, int(self._window))
+
+
+def _congestion_reason(exc: Exception) -> str | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status == 429:
+        return "429"
+    if isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__:
+        return "timeout"
+    return None
+
+
+_controllers: dict[str, AIMDController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(model: str, initial: int) -> AIMDController:
+    """Return the process-wide controller for a TTS model.
+
+    The window carries over between stories; `initial` only seeds a new one.
+    """
+    with _controllers_lock:
+        if model not in _controllers:
+            _controllers[model] = AIMDController(model, initial)
+        return _controllers[model]
+
+
+def controller_snapshots() -> list[dict]:
+    """Snapshots of every controller created in this process."""
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return [controller.snapshot() for controller in controllers]
@@ -1,37 +1,159 @@
 import logging
+import os
+import time
+import uuid
+from contextlib import nullcontext
 
 from openai import OpenAI
 
-from config import OPENAI_API_KEY, TTS_MODEL, TTS_RESPONSE_FORMAT, TTS_SPEED
+from config import (
+    OPENAI_API_KEY,
+    STORAGE_DIR,
+    TTS_CACHE_MAX_BYTES,
+    TTS_HEDGE_ENABLED,
+    TTS_HEDGE_MAX_FRACTION,
+    TTS_HEDGE_MIN_SAMPLES,
+    TTS_HEDGE_PERCENTILE,
+    TTS_MODEL,
+    TTS_RESPONSE_FORMAT,
+    TTS_ROUTE_MAX_ERROR_RATE,
+    TTS_ROUTE_PROBE_INTERVAL_S,
+    TTS_ROUTE_SLO_MS_PER_CHAR,
+    TTS_ROUTE_WINDOW_S,
+    TTS_SPEED,
+)
+from ratelimit.limiter import call_with_retry
+from tts.cache import TTSCache, make_key
+from tts.concurrency import AIMDController
+from tts.hedging import Hedger
+from tts.latency import latency_units
+from tts.routing import ModelRouter
 
 logger = logging.getLogger(__name__)
 
-_client = OpenAI(api_key=OPENAI_API_KEY)
+# Retries are handled by ratelimit.limiter so they share the process-wide quota
+_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+_cache = TTSCache(os.path.join(STORAGE_DIR, "tts_cache"), TTS_CACHE_MAX_BYTES)
+_router = ModelRouter(
+    TTS_ROUTE_SLO_MS_PER_CHAR,
+    TTS_ROUTE_MAX_ERROR_RATE,
+    window_s=TTS_ROUTE_WINDOW_S,
+    probe_interval_s=TTS_ROUTE_PROBE_INTERVAL_S,
+)
+_hedger = Hedger(TTS_HEDGE_PERCENTILE, TTS_HEDGE_MAX_FRACTION, min_samples=TTS_HEDGE_MIN_SAMPLES)
 
+# Size of the chunks streamed from the API response to disk
+_STREAM_CHUNK_BYTES = 64 * 1024
 
-def synthesize(text: str, voice: str, instructions: str, model_override: str | None = None) -> bytes:
-    """Synthesize speech via the OpenAI TTS API.
 
-    Args:
-        text: The text to speak.
-        voice: OpenAI voice name (alloy, ash, ballad, coral, echo, fable, nova, onyx, sage, shimmer).
-        instructions: Style/emotion instruction for gpt-4o-mini-tts.
-        model_override: Optional model name to use instead of the default.
+def _speech_params(text: str, voice: str, instructions: str, model: str) -> dict:
+    return {
+        "model": model,
+        "voice": voice,
+        "input": text,
+        "instructions": instructions,
+        "response_format": TTS_RESPONSE_FORMAT,
+        "speed": TTS_SPEED,
+    }
+
+
+def synthesize_to_file(
+    text: str,
+    voice: str,
+    instructions: str,
+    output_path: str,
+    model_override: str | None = None,
+    controller: AIMDController | None = None,
+) -> int:
+    """Synthesize speech straight to output_path, streaming the response to disk.
+
+    Only one chunk of the response is held in memory at a time. Identical
+    (text, voice, instructions, model, speed, format) inputs are served
+    from the on-disk cache without calling the API. With TTS_HEDGE_ENABLED,
+    a request slower than the recent latency percentile is duplicated and
+    the first response to finish is kept. When a controller is given, every
+    request attempt holds one of its in-flight slots and reports its outcome.
 
     Returns:
-        Raw audio bytes in the configured format (MP3).
+        Characters billed: 0 for a cache hit, len(text) per request sent.
     """
     model = model_override or TTS_MODEL
+    key = make_key(text, voice, instructions, model, TTS_SPEED, TTS_RESPONSE_FORMAT)
+
+    if _cache.get_file(key, output_path):
+        logger.info("TTS cache hit for voice=%s -> %s", voice, output_path)
+        return 0
+
+    def _fetch() -> str:
+        # Stream into a temp name so a failed request never leaves a truncated file behind
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.part"
 
-    response = _client.audio.speech.create(
-        model=model,
-        voice=voice,
-        input=text,
-        instructions=instructions,
-        response_format=TTS_RESPONSE_FORMAT,
-        speed=TTS_SPEED,
+        def _stream():
+            with controller.slot(len(text)) if controller else nullcontext():
+                started = time.monotonic()
+                try:
+                    with _client.audio.speech.with_streaming_response.create(
+                        **_speech_params(text, voice, instructions, model)
+                    ) as response:
+                        with open(tmp_path, "wb") as f:
+                            for chunk in response.iter_bytes(_STREAM_CHUNK_BYTES):
+                                f.write(chunk)
+                except Exception:
+                    _router.record(model, time.monotonic() - started, len(text), ok=False)
+                    raise
+                elapsed = time.monotonic() - started
+                _router.record(model, elapsed, len(text), ok=True)
+                # Only the HTTP attempt: rate-limiter waits and retry backoff
+                # would inflate the hedging percentile under throttling
+                if TTS_HEDGE_ENABLED:
+                    _hedger.observe(elapsed, latency_units(len(text)))
+
+        try:
+            call_with_retry(_stream, "openai", model, units=len(text))
+        except Exception:
+            _remove_quietly(tmp_path)
+            raise
+        return tmp_path
+
+    if TTS_HEDGE_ENABLED:
+        # Per character, so long segments are not hedged just for being long
+        tmp_path, requests_sent = _hedger.run(
+            _fetch, discard=_remove_quietly, timed=False, units=latency_units(len(text)),
+        )
+    else:
+        tmp_path, requests_sent = _fetch(), 1
+    os.replace(tmp_path, output_path)
+
+    logger.info(
+        "Streamed %d bytes for voice=%s -> %s",
+        os.path.getsize(output_path), voice, output_path,
     )
+    _cache.put_file(key, output_path)
+    return len(text) * requests_sent
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def cache_stats() -> dict:
+    """Return process-wide TTS cache counters (hits, misses, size_bytes)."""
+    return _cache.stats()
+
+
+def route_model(primary: str | None, fallback: str | None) -> str:
+    """Pick the TTS model for the next request: the primary unless it breaches its SLO."""
+    return _router.choose(primary or TTS_MODEL, fallback)
+
+
+def routing_stats() -> dict:
+    """Return rolling per-model health (samples, error_rate, p90_ms_per_char, on_fallback)."""
+    return _router.stats()
+
 
-    audio_bytes = response.content
-    logger.info("Synthesized %d bytes for voice=%s", len(audio_bytes), voice)
-    return audio_bytes
+def hedge_stats() -> dict:
+    """Return process-wide hedging counters (calls, hedges, threshold_s_per_unit)."""
+    return _hedger.stats()
@@ -0,0 +1,126 @@
+"""Hedged requests: duplicate a call that runs longer than usual, keep the first result."""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """Fire a backup request once the primary exceeds a latency percentile.
+
+    Latencies of successful calls are tracked per unit of work (e.g. per
+    character) over a sliding window. Once min_samples are known, a call
+    still running after the configured percentile of that window, scaled by
+    the call's own units, gets a duplicate, as long as duplicates stay
+    under max_fraction of all calls. Whichever finishes first successfully
+    wins; the loser's result is passed to `discard` when it eventually lands.
+    """
+
+    def __init__(
+        self,
+        percentile: float,
+        max_fraction: float,
+        min_samples: int = 20,
+        window: int = 200,
+        max_workers: int = 32,
+    ):
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedges = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def threshold(self) -> float | None:
+        """Current hedging delay in seconds per unit, or None while there is too little data."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(self.percentile * (len(ordered) - 1))]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "hedges": self.hedges, "threshold_s_per_unit": self.threshold()}
+
+    def observe(self, seconds: float, units: float = 1):
+        """Add the latency of one successful call of `units` units of work to the window."""
+        with self._lock:
+            self._latencies.append(seconds / units)
+
+    def run(
+        self,
+        fn: Callable[[], T],
+        discard: Callable[[T], None] | None = None,
+        timed: bool = True,
+        units: float = 1,
+    ) -> tuple[T, int]:
+        """Run fn(), a call of `units` units of work, hedging it if it is slow.
+
+        With timed=False the call's duration is not recorded; fn reports
+        the latency that matters (e.g. without queueing or retry backoff)
+        through observe() instead.
+
+        Returns:
+            (result, requests_sent) — requests_sent is 2 when a hedge was fired.
+        """
+        with self._lock:
+            self.calls += 1
+        call = (lambda: self._timed(fn, units)) if timed else fn
+        threshold = self.threshold()
+        if threshold is None:
+            return call(), 1
+        threshold *= units
+
+        primary = self._executor.submit(call)
+        try:
+            return primary.result(timeout=threshold), 1
+        except FutureTimeout:
+            pass
+
+        with self._lock:
+            allowed = self.hedges + 1 <= self.max_fraction * self.calls
+            if allowed:
+                self.hedges += 1
+        if not allowed:
+            return primary.result(), 1
+
+        logger.info("Request exceeded p%d latency (%.1fs), sending hedge", self.percentile * 100, threshold)
+        backup = self._executor.submit(call)
+        return self._first_success([primary, backup], discard), 2
+
+    def _timed(self, fn: Callable[[], T], units: float) -> T:
+        started = time.monotonic()
+        result = fn()
+        self.observe(time.monotonic() - started, units)
+        return result
+
+    @staticmethod
+    def _first_success(futures: list[Future], discard: Callable[[T], None] | None) -> T:
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if discard:
+                        for other in pending:
+                            other.add_done_callback(
+                                lambda f: f.exception() is None and discard(f.result())
+                            )
+                    # A second request may have finished in the same instant
+                    for other in done - {future}:
+                        if discard and other.exception() is None:
+                            discard(other.result())
+                    return future.result()
+                error = future.exception()
+        raise error
@@ -0,0 +1,18 @@
+"""Per-character latency of TTS requests, shared by concurrency control, routing and hedging."""
+
+from config import TTS_LATENCY_MIN_CHARS
+
+
+def latency_units(chars: int) -> int:
+    """Characters a request's latency is spread over: at least TTS_LATENCY_MIN_CHARS.
+
+    Time to first byte dominates a short line such as "Oh no!", so its raw
+    milliseconds per character would read many times slower than a healthy
+    long segment's.
+    """
+    return max(chars, TTS_LATENCY_MIN_CHARS)
+
+
+def latency_per_char(seconds: float, chars: int) -> float:
+    """Seconds per character of a request, with short requests floored (see latency_units)."""
+    return seconds / latency_units(chars)
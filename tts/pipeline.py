@@ -1,7 +1,24 @@
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
+from pydub import AudioSegment
+
+from audio.assembler import load_audio
 from story.schema import StructuredStory, Segment
-from tts.engine import synthesize
+from config import (
+    TTS_AIMD_MAX_CONCURRENCY,
+    TTS_MODEL,
+    TTS_RESPONSE_FORMAT,
+    TTS_SPEED,
+    TTS_SPLIT_GAP_MS,
+)
+from tts.cache import make_key
+from tts.coalesce import merged_text, plan_groups, split_audio
+from tts.concurrency import AIMDController, get_controller
+from tts.engine import cache_stats, route_model, synthesize_to_file
+from tts.splitting import plan_pieces
 from tts.voice_mapper import (
     build_narrator_instruction,
     build_voice_instruction,
@@ -14,75 +31,394 @@ logger = logging.getLogger(__name__)
 
 def synthesize_story(
     story: StructuredStory,
+    spool_dir: str,
     tts_model: str | None = None,
     recordings: dict[int, str] | None = None,
     language: str = "en",
+    max_workers: int = 1,
+    coalesce_max_chars: int = 0,
+    reuse: dict[int, dict] | None = None,
+    adaptive: bool = False,
+    split_max_chars: int = 0,
+    fallback_model: str | None = None,
+    on_result: Callable[[dict], None] | None = None,
 ) -> tuple[list[dict], int]:
     """Synthesize all segments of a story via OpenAI TTS.
 
     Args:
         story: The structured story to synthesize.
+        spool_dir: Directory the synthesized audio is streamed into, one file
+            per segment. The returned audio paths point into it, so the
+            caller owns it and removes it after assembly.
         tts_model: Optional TTS model override.
         recordings: Optional mapping of segment_id → WAV file path for
             user-recorded segments that should skip TTS.
         language: Language code for voice selection (en, fr, de, es).
+        max_workers: Maximum number of TTS requests in flight at once.
+            Results are always returned in story order, whatever order
+            the requests complete in.
+        coalesce_max_chars: When > 0, runs of adjacent segments with the same
+            voice and instructions are sent as one request of up to this many
+            characters and split back into segments afterwards.
+        reuse: Optional mapping of segment_id → a result dict from an earlier
+            run. Segments whose fingerprint still matches reuse that audio
+            instead of calling TTS.
+        adaptive: When True, max_workers only seeds the model's shared AIMD
+            controller, which then grows or shrinks the number of requests in
+            flight from observed latency, 429s and timeouts.
+        split_max_chars: When > 0, segments longer than this are split at
+            sentence boundaries (for the story language), the pieces are
+            synthesized in parallel and rejoined with TTS_SPLIT_GAP_MS of
+            silence between them.
+        fallback_model: Optional TTS model that segments are routed to while
+            tts_model breaches its latency/error SLO (see tts.engine.route_model).
+        on_result: Optional callback given each result dict in story order, as
+            soon as it and every segment before it are done (e.g. to publish
+            the finished prefix of the story while the rest is synthesized).
 
     Returns a tuple of:
-    - list of dicts: [{"audio_bytes": bytes, "pause_after_ms": int, "format": str}, ...]
-    - total_tts_chars: int — total characters sent to TTS
+    - list of dicts: [{"segment_id": int, "audio_path": str | None,
+      "pause_after_ms": int, "format": str, "fingerprint": str | None,
+      "model": str | None, "tts_chars": int}, ...]
+      (audio_path is None when a segment failed to synthesize; fingerprint and
+      model are None for user recordings; model is the TTS model that actually
+      produced the segment and tts_chars what it billed)
+    - total_tts_chars: int — total characters sent to TTS (cache hits are free
+      and not counted)
     """
     char_map = {ch.name: ch for ch in story.characters}
+    primary = tts_model or TTS_MODEL
+    candidate_models = {primary, fallback_model or primary}
     recordings = recordings or {}
-    _current_language = language
-
-    results = []
-    total = len(story.segments)
-    total_tts_chars = 0
-
-    for i, segment in enumerate(story.segments):
-        logger.info("Synthesizing segment %d/%d (type=%s)", i + 1, total, segment.type)
+    os.makedirs(spool_dir, exist_ok=True)
 
-        # Check if user recorded this segment
-        rec_path = recordings.get(segment.segment_id)
+    # Recorded and reusable segments need no request and are never merged
+    ready: dict[int, dict] = {}
+    voice_keys: dict[int, tuple[str, str] | None] = {}
+    reuse = reuse or {}
+    reused = 0
+    for segment in story.segments:
+        rec_path = _recording_path(segment, recordings)
         if rec_path:
-            try:
-                with open(rec_path, "rb") as f:
-                    wav_bytes = f.read()
-                logger.info("Using user recording for segment %d", segment.segment_id)
-                results.append({
-                    "audio_bytes": wav_bytes,
-                    "pause_after_ms": segment.pause_after_ms,
-                    "format": "wav",
-                })
+            logger.info("Using user recording for segment %d", segment.segment_id)
+            ready[segment.segment_id] = _result(segment, rec_path, "wav", None)
+            voice_keys[segment.segment_id] = None
+            continue
+        voice_key = resolve_voice(segment, char_map, language)
+        # Audio made by the fallback model during an outage is as good to keep
+        fingerprints = {
+            segment_fingerprint(segment.text, voice_key, model) for model in candidate_models
+        }
+        previous = reuse.get(segment.segment_id)
+        if (
+            previous
+            and previous.get("fingerprint") in fingerprints
+            and previous.get("audio_path")
+            and os.path.isfile(previous["audio_path"])
+        ):
+            ready[segment.segment_id] = _result(
+                segment, previous["audio_path"], previous["format"],
+                previous["fingerprint"], previous.get("model"),
+            )
+            voice_keys[segment.segment_id] = None
+            reused += 1
+            continue
+        voice_keys[segment.segment_id] = voice_key
+    if reused:
+        logger.info("Reusing existing audio for %d/%d segments", reused, len(story.segments))
+
+    # Over-long segments become several requests and are never merged
+    split_pieces: dict[int, list[str]] = {}
+    if split_max_chars > 0:
+        for segment in story.segments:
+            if voice_keys[segment.segment_id] is None:
                 continue
-            except Exception as e:
-                logger.warning(
-                    "Failed to read recording for segment %d, falling back to TTS: %s",
-                    segment.segment_id, e,
-                )
-
-        voice, instructions = _resolve_voice(segment, char_map, _current_language)
-        total_tts_chars += len(segment.text)
-
-        try:
-            audio_bytes = synthesize(segment.text, voice, instructions, model_override=tts_model)
-            results.append({
-                "audio_bytes": audio_bytes,
-                "pause_after_ms": segment.pause_after_ms,
-                "format": "mp3",
-            })
-        except Exception as e:
-            logger.error("Failed to synthesize segment %d: %s", segment.segment_id, e)
-            results.append({
-                "audio_bytes": b"",
-                "pause_after_ms": segment.pause_after_ms,
-                "format": "mp3",
-            })
+            pieces = plan_pieces(segment.text, language, split_max_chars)
+            if len(pieces) > 1:
+                split_pieces[segment.segment_id] = pieces
+        if split_pieces:
+            logger.info("Splitting %d long segments at sentence boundaries", len(split_pieces))
+
+    if coalesce_max_chars > 0:
+        mergeable = {
+            sid: None if sid in split_pieces else key for sid, key in voice_keys.items()
+        }
+        groups = plan_groups(story.segments, mergeable, coalesce_max_chars)
+    else:
+        groups = [[segment] for segment in story.segments]
+
+    # One task per request: a group, or one piece (index, text) of a split segment
+    tasks: list[tuple[list[Segment], tuple[int, str] | None]] = []
+    for group in groups:
+        pieces = split_pieces.get(group[0].segment_id) if len(group) == 1 else None
+        if pieces:
+            tasks.extend((group, (k, text)) for k, text in enumerate(pieces))
+        else:
+            tasks.append((group, None))
+
+    initial_window = max_workers
+    if adaptive:
+        max_workers = TTS_AIMD_MAX_CONCURRENCY
 
+    # Routed once per segment, so the pieces of a split segment share a voice model
+    segment_models: dict[int, str] = {}
+
+    def _route(segment: Segment) -> tuple[str, AIMDController | None]:
+        if segment.segment_id not in segment_models:
+            segment_models[segment.segment_id] = route_model(primary, fallback_model)
+        model = segment_models[segment.segment_id]
+        return model, get_controller(model, initial_window) if adaptive else None
+
+    def _run(indexed: tuple[int, tuple]) -> list[tuple[dict, int]] | tuple[str | None, int]:
+        i, (group, piece) = indexed
+        if group[0].segment_id in ready:
+            return [(ready[group[0].segment_id], 0)]
+        if piece is not None:
+            segment = group[0]
+            logger.info(
+                "Synthesizing request %d/%d (segment %d, piece %d/%d)",
+                i + 1, len(tasks), segment.segment_id,
+                piece[0] + 1, len(split_pieces[segment.segment_id]),
+            )
+            model, controller = _route(segment)
+            return _synthesize_piece(
+                segment, piece, voice_keys[segment.segment_id], model, spool_dir, controller,
+            )
+        if len(group) > 1:
+            logger.info(
+                "Synthesizing request %d/%d (segments %d-%d coalesced)",
+                i + 1, len(tasks), group[0].segment_id, group[-1].segment_id,
+            )
+            model, controller = _route(group[0])
+            outcomes, billed = _synthesize_group(
+                group, voice_keys[group[0].segment_id], model, spool_dir, controller,
+            )
+            if outcomes is not None:
+                return outcomes
+            logger.warning(
+                "Could not split coalesced segments %d-%d, synthesizing them one by one",
+                group[0].segment_id, group[-1].segment_id,
+            )
+        else:
+            logger.info(
+                "Synthesizing request %d/%d (segment %d, type=%s)",
+                i + 1, len(tasks), group[0].segment_id, group[0].type,
+            )
+            model, controller = _route(group[0])
+            billed = 0
+
+        outcomes = [
+            synthesize_segment(
+                segment, voice_keys[segment.segment_id], model, spool_dir, controller,
+            )
+            for segment in group
+        ]
+        # Characters already paid for by a merged request that could not be split
+        first_result, first_chars = outcomes[0]
+        outcomes[0] = (first_result, first_chars + billed)
+        return outcomes
+
+    outcomes: list[tuple[dict, int]] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # map() yields in submission order, so results line up with story.segments
+        # and the pieces of a split segment arrive consecutively
+        piece_outcomes: list[tuple[str | None, int]] = []
+        for (group, piece), done in zip(tasks, executor.map(_run, enumerate(tasks))):
+            completed = len(outcomes)
+            if piece is None:
+                outcomes.extend(done)
+            else:
+                piece_outcomes.append(done)
+                segment = group[0]
+                if len(piece_outcomes) == len(split_pieces[segment.segment_id]):
+                    outcomes.append(_join_pieces(
+                        segment, piece_outcomes, voice_keys[segment.segment_id],
+                        segment_models[segment.segment_id], spool_dir,
+                    ))
+                    piece_outcomes = []
+            if on_result is not None:
+                for result, _ in outcomes[completed:]:
+                    on_result(result)
+
+    results = []
+    for result, chars in outcomes:
+        result["tts_chars"] = chars
+        results.append(result)
+    total_tts_chars = sum(chars for _, chars in outcomes)
+    stats = cache_stats()
+    logger.info(
+        "Story synthesis done: %d TTS chars billed (TTS cache totals: hits=%d misses=%d)",
+        total_tts_chars, stats["hits"], stats["misses"],
+    )
     return results, total_tts_chars
 
 
-def _resolve_voice(segment: Segment, char_map: dict, language: str = "en") -> tuple[str, str]:
+def _recording_path(segment: Segment, recordings: dict[int, str]) -> str | None:
+    """Return the segment's recording path if the file is present on disk."""
+    rec_path = recordings.get(segment.segment_id)
+    if not rec_path:
+        return None
+    if os.path.isfile(rec_path):
+        return rec_path
+    logger.warning(
+        "Recording for segment %d not found at %s, falling back to TTS",
+        segment.segment_id, rec_path,
+    )
+    return None
+
+
+def segment_fingerprint(text: str, voice_key: tuple[str, str], tts_model: str | None) -> str:
+    """Hash of everything that determines a segment's synthesized audio."""
+    voice, instructions = voice_key
+    return make_key(text, voice, instructions, tts_model or TTS_MODEL, TTS_SPEED, TTS_RESPONSE_FORMAT)
+
+
+def _result(
+    segment: Segment,
+    audio_path: str | None,
+    fmt: str,
+    fingerprint: str | None,
+    model: str | None = None,
+) -> dict:
+    return {
+        "segment_id": segment.segment_id,
+        "audio_path": audio_path,
+        "pause_after_ms": segment.pause_after_ms,
+        "format": fmt,
+        "fingerprint": fingerprint,
+        "model": model,
+    }
+
+
+def synthesize_segment(
+    segment: Segment,
+    voice_key: tuple[str, str],
+    tts_model: str | None,
+    spool_dir: str,
+    controller: AIMDController | None = None,
+) -> tuple[dict, int]:
+    """Return (result dict, characters sent to TTS) for a single segment."""
+    voice, instructions = voice_key
+    audio_path = os.path.join(spool_dir, f"{segment.segment_id}.{TTS_RESPONSE_FORMAT}")
+
+    try:
+        billed = synthesize_to_file(
+            segment.text, voice, instructions, audio_path,
+            model_override=tts_model, controller=controller,
+        )
+    except Exception as e:
+        logger.error("Failed to synthesize segment %d: %s", segment.segment_id, e)
+        return _result(segment, None, TTS_RESPONSE_FORMAT, None, tts_model or TTS_MODEL), len(segment.text)
+
+    fingerprint = segment_fingerprint(segment.text, voice_key, tts_model)
+    result = _result(segment, audio_path, TTS_RESPONSE_FORMAT, fingerprint, tts_model or TTS_MODEL)
+    return result, billed
+
+
+def _synthesize_group(
+    group: list[Segment],
+    voice_key: tuple[str, str],
+    tts_model: str | None,
+    spool_dir: str,
+    controller: AIMDController | None = None,
+) -> tuple[list[tuple[dict, int]] | None, int]:
+    """Synthesize a coalesced group as one request and split it per segment.
+
+    Returns (outcomes, billed_chars); outcomes is None when the request failed
+    or the boundaries could not be recovered, so the caller can fall back.
+    """
+    voice, instructions = voice_key
+    text = merged_text(group)
+    merged_path = os.path.join(
+        spool_dir, f"{group[0].segment_id}-{group[-1].segment_id}.{TTS_RESPONSE_FORMAT}",
+    )
+    try:
+        billed = synthesize_to_file(
+            text, voice, instructions, merged_path, model_override=tts_model, controller=controller,
+        )
+    except Exception as e:
+        logger.error(
+            "Failed to synthesize coalesced segments %d-%d: %s",
+            group[0].segment_id, group[-1].segment_id, e,
+        )
+        return None, 0
+
+    try:
+        audio = load_audio(merged_path, TTS_RESPONSE_FORMAT)
+        pieces = split_audio(audio, [segment.text for segment in group])
+    except Exception as e:
+        logger.error("Failed to decode coalesced audio %s: %s", merged_path, e)
+        pieces = None
+    finally:
+        os.remove(merged_path)
+    if pieces is None:
+        return None, billed
+
+    outcomes = []
+    for segment, piece in zip(group, pieces):
+        piece_path = os.path.join(spool_dir, f"{segment.segment_id}.wav")
+        piece.export(piece_path, format="wav")
+        fingerprint = segment_fingerprint(segment.text, voice_key, tts_model)
+        outcomes.append((_result(segment, piece_path, "wav", fingerprint, tts_model or TTS_MODEL), 0))
+    outcomes[0] = (outcomes[0][0], billed)
+    return outcomes, billed
+
+
+def _synthesize_piece(
+    segment: Segment,
+    piece: tuple[int, str],
+    voice_key: tuple[str, str],
+    tts_model: str | None,
+    spool_dir: str,
+    controller: AIMDController | None = None,
+) -> tuple[str | None, int]:
+    """Synthesize one piece of a split segment; returns (audio_path or None, billed_chars)."""
+    k, text = piece
+    voice, instructions = voice_key
+    audio_path = os.path.join(spool_dir, f"{segment.segment_id}.{k}.{TTS_RESPONSE_FORMAT}")
+    try:
+        billed = synthesize_to_file(
+            text, voice, instructions, audio_path,
+            model_override=tts_model, controller=controller,
+        )
+    except Exception as e:
+        logger.error("Failed to synthesize segment %d piece %d: %s", segment.segment_id, k, e)
+        return None, len(text)
+    return audio_path, billed
+
+
+def _join_pieces(
+    segment: Segment,
+    pieces: list[tuple[str | None, int]],
+    voice_key: tuple[str, str],
+    tts_model: str | None,
+    spool_dir: str,
+) -> tuple[dict, int]:
+    """Rejoin the pieces of a split segment into one WAV with a short gap between them."""
+    billed = sum(chars for _, chars in pieces)
+    paths = [path for path, _ in pieces]
+    audio_path = os.path.join(spool_dir, f"{segment.segment_id}.wav")
+    try:
+        if None in paths:
+            raise RuntimeError("some pieces failed to synthesize")
+        gap = AudioSegment.silent(duration=TTS_SPLIT_GAP_MS)
+        joined = load_audio(paths[0], TTS_RESPONSE_FORMAT)
+        for path in paths[1:]:
+            joined += gap + load_audio(path, TTS_RESPONSE_FORMAT)
+        joined.export(audio_path, format="wav")
+    except Exception as e:
+        logger.error("Failed to rejoin split segment %d: %s", segment.segment_id, e)
+        return _result(segment, None, TTS_RESPONSE_FORMAT, None, tts_model or TTS_MODEL), billed
+    finally:
+        for path in paths:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    fingerprint = segment_fingerprint(segment.text, voice_key, tts_model)
+    return _result(segment, audio_path, "wav", fingerprint, tts_model or TTS_MODEL), billed
+
+
+def resolve_voice(segment: Segment, char_map: dict, language: str = "en") -> tuple[str, str]:
     """Return (voice_name, instructions) for a segment."""
     if segment.type == "narration" or segment.character is None:
         return get_narrator_voice(language), build_narrator_instruction(segment.emotion)
@@ -0,0 +1,98 @@
+"""Latency- and error-aware routing between TTS models."""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from tts.latency import latency_per_char
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRouter:
+    """Route requests away from a TTS model that breaches its SLO.
+
+    Every request attempt is recorded per model with its outcome and latency
+    per character, short requests counted at TTS_LATENCY_MIN_CHARS so that
+    time to first byte does not read as a slow model. Samples older than window_s are forgotten. A model is
+    unhealthy when its error rate exceeds max_error_rate, or when its p90
+    latency per character exceeds slo_ms_per_char. Fewer than min_samples
+    samples always count as healthy.
+
+    While the primary is unhealthy, requests go to the fallback. One request
+    per probe_interval_s still goes to the primary, so its recovery is noticed
+    and traffic switches back.
+    """
+
+    def __init__(
+        self,
+        slo_ms_per_char: float,
+        max_error_rate: float,
+        window_s: float = 300,
+        min_samples: int = 8,
+        probe_interval_s: float = 30,
+    ):
+        self.slo_ms_per_char = slo_ms_per_char
+        self.max_error_rate = max_error_rate
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.probe_interval_s = probe_interval_s
+        self._samples: dict[str, deque[tuple[float, bool, float]]] = {}
+        self._last_probe: dict[str, float] = {}
+        self._on_fallback: set[str] = set()
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float, chars: int, ok: bool):
+        with self._lock:
+            samples = self._samples.setdefault(model, deque())
+            samples.append((time.monotonic(), ok, latency_per_char(seconds, chars) * 1000))
+
+    def choose(self, primary: str, fallback: str | None) -> str:
+        """Return the model the next request for `primary` should use."""
+        if not fallback or fallback == primary:
+            return primary
+        with self._lock:
+            if self._healthy(primary) or not self._healthy(fallback):
+                if primary in self._on_fallback:
+                    self._on_fallback.discard(primary)
+                    logger.info("TTS routing: %s recovered, switching back from %s", primary, fallback)
+                return primary
+            if primary not in self._on_fallback:
+                self._on_fallback.add(primary)
+                logger.warning("TTS routing: %s breaches its SLO, routing to %s", primary, fallback)
+            now = time.monotonic()
+            if now - self._last_probe.get(primary, 0.0) >= self.probe_interval_s:
+                self._last_probe[primary] = now
+                return primary
+            return fallback
+
+    def stats(self) -> dict:
+        """Per-model sample count, error rate, p90 latency per character and fallback state."""
+        with self._lock:
+            return {
+                model: {**self._summary(model), "on_fallback": model in self._on_fallback}
+                for model in self._samples
+            }
+
+    def _summary(self, model: str) -> dict:
+        samples = self._samples.get(model, deque())
+        cutoff = time.monotonic() - self.window_s
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+        latencies = sorted(per_char for _, ok, per_char in samples if ok)
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        return {
+            "samples": len(samples),
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "p90_ms_per_char": latencies[int(0.9 * (len(latencies) - 1))] if latencies else None,
+        }
+
+    def _healthy(self, model: str) -> bool:
+        summary = self._summary(model)
+        if summary["samples"] < self.min_samples:
+            return True
+        if summary["error_rate"] > self.max_error_rate:
+            return False
+        p90 = summary["p90_ms_per_char"]
+        return p90 is None or p90 <= self.slo_ms_per_char
@@ -0,0 +1,61 @@
+"""Split over-long segments at sentence boundaries so they can be synthesized in parallel.
+
+A single long paragraph is one slow TTS request that gates the whole story.
+Its sentences are packed into pieces of up to max_chars, each piece is sent
+as its own request, and the audio is rejoined with a short gap in between.
+"""
+
+import re
+
+# Abbreviations whose trailing period does not end a sentence
+_ABBREVIATIONS = {
+    "en": {"mr", "mrs", "ms", "dr", "st", "prof", "mt", "vs", "etc"},
+    "fr": {"m", "mme", "mlle", "dr", "st", "ste", "pr", "etc"},
+    "de": {"hr", "fr", "dr", "prof", "st", "nr", "bzw", "usw", "ca", "z.b", "d.h"},
+    "es": {"sr", "sra", "srta", "dr", "dra", "d", "dña", "etc"},
+}
+
+# Sentence-ending punctuation, optionally followed by closing quotes or brackets
+# (French sets » and ! ? apart with a space), then whitespace
+_BOUNDARY = re.compile(r"[.!?…]+(?:\s*[\"'»”’)\]])*\s+")
+
+
+def split_sentences(text: str, language: str = "en") -> list[str]:
+    """Split text into sentences, keeping punctuation with each sentence."""
+    abbreviations = _ABBREVIATIONS.get(language, _ABBREVIATIONS["en"])
+    sentences = []
+    start = 0
+    for match in _BOUNDARY.finditer(text):
+        end = match.end()
+        # Dialog tags continue the sentence: "Stop!" he said.
+        if end < len(text) and text[end].islower():
+            continue
+        head = text[start:match.start() + 1].rstrip()
+        last_word = head.rsplit(None, 1)[-1].rstrip(".").lower() if head else ""
+        if text[match.start()] == "." and last_word in abbreviations:
+            continue
+        sentence = text[start:end].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = end
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def plan_pieces(text: str, language: str, max_chars: int) -> list[str]:
+    """Pack whole sentences into pieces of at most max_chars.
+
+    A single sentence longer than max_chars becomes a piece of its own.
+    Returns [text] when no split is needed.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    pieces: list[str] = []
+    for sentence in split_sentences(text, language):
+        if pieces and len(pieces[-1]) + 1 + len(sentence) <= max_chars:
+            pieces[-1] += " " + sentence
+        else:
+            pieces.append(sentence)
+    return pieces
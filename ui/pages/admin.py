@@ -4,10 +4,12 @@ from datetime import datetime, timedelta, timezone
 import pandas as pd
 from sqlalchemy import func
 
-from db.models import User, Story, Transaction
+from db.models import User, Story, SystemCost, Transaction
 from db.session import SessionLocal
 from db.settings import get_settings, update_settings
 from credits.service import add_credits
+from tts.concurrency import controller_snapshots
+from tts.engine import hedge_stats, routing_stats
 from i18n import t
 
 
@@ -338,8 +340,15 @@ def _render_costs(db):
         .all()
     )
 
-    total_cost = sum(s.cost_total or 0 for s in stories_with_costs)
-    avg_cost = total_cost / len(stories_with_costs) if stories_with_costs else 0
+    story_cost = sum(s.cost_total or 0 for s in stories_with_costs)
+    avg_cost = story_cost / len(stories_with_costs) if stories_with_costs else 0
+    # Spend no story is billed for (background BGM pool refills)
+    total_system = (
+        db.query(func.sum(SystemCost.cost_usd))
+        .filter(SystemCost.kind == "bgm_pool")
+        .scalar() or 0.0
+    )
+    total_cost = story_cost + total_system
     total_revenue = (
         db.query(func.sum(Transaction.amount_usd))
         .filter(Transaction.type == "purchase")
@@ -370,8 +379,9 @@ def _render_costs(db):
                 "Component": [
                     t("admin.comp_story_gen"), t("admin.comp_cover"),
                     t("admin.comp_tts"), t("admin.comp_bgm"),
+                    t("admin.comp_bgm_pool"),
                 ],
-                "Cost": [total_gen, total_cover, total_tts, total_bgm],
+                "Cost": [total_gen, total_cover, total_tts, total_bgm, total_system],
             }).set_index("Component")
             if breakdown["Cost"].sum() > 0:
                 st.bar_chart(breakdown, color="#FF8C00")
@@ -385,14 +395,18 @@ def _render_costs(db):
                 "Component": [
                     t("admin.comp_story_gen"), t("admin.comp_cover"),
                     t("admin.comp_tts"), t("admin.comp_bgm"),
+                    t("admin.comp_bgm_pool"),
+                ],
+                "Total": [
+                    f"${v:.4f}" for v in [total_gen, total_cover, total_tts, total_bgm, total_system]
                 ],
-                "Total": [f"${total_gen:.4f}", f"${total_cover:.4f}", f"${total_tts:.4f}", f"${total_bgm:.4f}"],
                 "Avg/Story": [
                     f"${v:.4f}" for v in [
                         total_gen / max(len(stories_with_costs), 1),
                         total_cover / max(len(stories_with_costs), 1),
                         total_tts / max(len(stories_with_costs), 1),
                         total_bgm / max(len(stories_with_costs), 1),
+                        total_system / max(len(stories_with_costs), 1),
                     ]
                 ],
             }, use_container_width=True)
@@ -450,6 +464,12 @@ def _render_models(db):
 
         with cfg2:
             st.markdown(t("admin.cfg_tts", model=settings.tts_model))
+            if settings.tts_fallback_model != "none":
+                st.markdown(t("admin.cfg_tts_fallback", model=settings.tts_fallback_model))
+            if settings.tts_adaptive_concurrency:
+                st.markdown(t("admin.cfg_tts_concurrency_adaptive", count=settings.tts_concurrency))
+            else:
+                st.markdown(t("admin.cfg_tts_concurrency", count=settings.tts_concurrency))
             bgm_status = (
                 t("admin.cfg_bgm_enabled", provider=settings.bgm_provider)
                 if settings.bgm_enabled
@@ -457,6 +477,51 @@ def _render_models(db):
             )
             st.markdown(t("admin.cfg_bgm", status=bgm_status))
 
+    # Live state of the adaptive TTS concurrency controllers in this process
+    snapshots = controller_snapshots()
+    if snapshots:
+        with st.container(border=True):
+            st.markdown(f"#### {t('admin.aimd_title')}")
+            for snap in snapshots:
+                st.markdown(t(
+                    "admin.aimd_window",
+                    model=snap["name"], window=snap["window"], in_flight=snap["in_flight"],
+                ))
+                if snap["decisions"]:
+                    st.dataframe(list(reversed(snap["decisions"])), use_container_width=True)
+
+    # Rolling health the TTS router uses to fall back from a slow primary model
+    routing = routing_stats()
+    if routing:
+        with st.container(border=True):
+            st.markdown(f"#### {t('admin.routing_title')}")
+            st.dataframe([
+                {
+                    "Model": model,
+                    "Samples": summary["samples"],
+                    "Error rate": f"{summary['error_rate']:.1%}",
+                    "p90 ms/char": (
+                        f"{summary['p90_ms_per_char']:.1f}"
+                        if summary["p90_ms_per_char"] is not None else "-"
+                    ),
+                    "On fallback": summary["on_fallback"],
+                }
+                for model, summary in routing.items()
+            ], use_container_width=True)
+
+    # Hedged TTS requests (duplicated when slower than the recent latency percentile)
+    hedging = hedge_stats()
+    if hedging["calls"]:
+        with st.container(border=True):
+            st.markdown(f"#### {t('admin.hedge_title')}")
+            threshold = hedging["threshold_s_per_unit"]
+            st.markdown(t(
+                "admin.hedge_summary",
+                calls=hedging["calls"],
+                hedges=hedging["hedges"],
+                threshold=f"{threshold * 1000:.1f} ms" if threshold is not None else "-",
+            ))
+
     # API key status
     with st.container(border=True):
         st.markdown(f"#### {t('admin.api_key_status')}")
@@ -515,6 +580,36 @@ def _render_models(db):
                     index=tts_models.index(settings.tts_model)
                     if settings.tts_model in tts_models else 0,
                 )
+                fallback_options = ["none"] + tts_models
+                tts_fallback_model = st.selectbox(
+                    t("admin.tts_fallback_model"),
+                    fallback_options,
+                    index=fallback_options.index(settings.tts_fallback_model)
+                    if settings.tts_fallback_model in fallback_options else 0,
+                    help=t("admin.tts_fallback_help"),
+                )
+                tts_concurrency = st.number_input(
+                    t("admin.tts_concurrency"),
+                    min_value=1,
+                    max_value=16,
+                    value=int(settings.tts_concurrency or 1),
+                    help=t("admin.tts_concurrency_help"),
+                )
+                tts_adaptive = st.toggle(
+                    t("admin.tts_adaptive"),
+                    value=bool(settings.tts_adaptive_concurrency),
+                    help=t("admin.tts_adaptive_help"),
+                )
+                tts_coalesce = st.toggle(
+                    t("admin.tts_coalesce"),
+                    value=bool(settings.tts_coalesce),
+                    help=t("admin.tts_coalesce_help"),
+                )
+                tts_speculative = st.toggle(
+                    t("admin.tts_speculative"),
+                    value=bool(settings.tts_speculative),
+                    help=t("admin.tts_speculative_help"),
+                )
 
                 st.markdown(f"**{t('admin.bgm')}**")
                 bgm_enabled = st.toggle(
@@ -538,6 +633,11 @@ def _render_models(db):
                     story_model=story_model,
                     image_provider=image_provider,
                     tts_model=tts_model,
+                    tts_fallback_model=tts_fallback_model,
+                    tts_concurrency=int(tts_concurrency),
+                    tts_adaptive_concurrency=tts_adaptive,
+                    tts_coalesce=tts_coalesce,
+                    tts_speculative=tts_speculative,
                     bgm_enabled=bgm_enabled,
                     bgm_provider=bgm_provider if bgm_enabled else "none",
                 )
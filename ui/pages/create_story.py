@@ -9,8 +9,8 @@ from db.session import SessionLocal
 from story.generator import generate_story
 from story.cover import generate_cover_image
 from story.schema import StructuredStory
-from storage.file_store import download_and_save_image, save_recording
-from audio.effects import apply_effect
+from storage.file_store import copy_recording, download_and_save_image
+from workers import speculative, voice_effects
 from workers.story_worker import submit_tts_job
 from credits.service import check_balance, deduct_credit
 from credits.cost_tracker import (
@@ -265,11 +265,19 @@ def _show_story_preview():
                     t("create.record_voice"), key=rec_key,
                 )
                 if recording:
+                    # Start the effect now so saving only has to pick up the result
+                    try:
+                        voice_effects.submit(recording.getvalue(), st.session_state[f"fx_{seg.segment_id}"])
+                    except Exception as e:
+                        # Saving applies the effect again through result()
+                        logger.warning("Voice effect preprocessing failed: %s", e)
                     st.audio(recording, format="audio/wav")
                     st.caption(t("create.recording_saved"))
 
             edited_segments.append((seg.segment_id, new_text))
 
+    _speculate(structured, params, edited_segments)
+
     col_save, col_discard = st.columns(2)
 
     with col_save:
@@ -290,26 +298,56 @@ def _show_story_preview():
             del st.session_state["preview_story"]
             del st.session_state["story_params"]
             _clear_draft(st.session_state["user_id"])
+            speculative.cancel(st.session_state["user_id"])
             st.rerun()
 
 
+def _speculate(structured, params, edited_segments):
+    """Keep speculative background TTS in step with the draft, if enabled."""
+    try:
+        from db.settings import get_settings
+        db = SessionLocal()
+        try:
+            settings = get_settings(db)
+            enabled, tts_model = settings.tts_speculative, settings.tts_model
+        finally:
+            db.close()
+        if not enabled:
+            return
+
+        # Synthesize what would be saved right now: the draft with current edits
+        draft = structured.model_copy(deep=True)
+        edits = dict(edited_segments)
+        for seg in draft.segments:
+            new_text = (edits.get(seg.segment_id) or "").strip()
+            if new_text:
+                seg.text = new_text
+        recorded = {
+            seg.segment_id for seg in draft.segments
+            if st.session_state.get(f"rec_{seg.segment_id}")
+        }
+        speculative.update(
+            st.session_state["user_id"], draft, params.get("language", "en"), tts_model,
+            skip_segment_ids=recorded,
+        )
+    except Exception as e:
+        logger.warning("Speculative TTS update failed: %s", e)
+
+
 def _save_and_generate(structured, params):
     db = SessionLocal()
     try:
         story_id = str(uuid.uuid4())
         user_id = st.session_state["user_id"]
 
-        # Collect user voice recordings from session state
+        # Collect user voice recordings, already processed in the background
         recordings = {}
         for seg in structured.segments:
             rec = st.session_state.get(f"rec_{seg.segment_id}")
             if rec:
-                raw_bytes = rec.read()
                 fx = st.session_state.get(f"fx_{seg.segment_id}", "clean")
-                if fx and fx.lower() != "clean":
-                    raw_bytes = apply_effect(raw_bytes, fx)
-                path = save_recording(story_id, seg.segment_id, raw_bytes)
-                recordings[seg.segment_id] = path
+                processed = voice_effects.result(rec.getvalue(), fx)
+                recordings[seg.segment_id] = copy_recording(story_id, seg.segment_id, processed)
 
         # Deduct credit (story_id=None because the story row doesn't exist yet;
         # we link the transaction to the story after it is committed)
@@ -379,8 +417,9 @@ def _save_and_generate(structured, params):
         credit_txn.story_id = story_id
         db.commit()
 
-        # Submit TTS job
-        submit_tts_job(story_id, structured)
+        # Submit TTS job, handing over segments synthesized during the preview
+        reuse, prefetched_chars = speculative.take(user_id, story_id)
+        submit_tts_job(story_id, structured, reuse=reuse, prefetched_chars=prefetched_chars)
 
         del st.session_state["preview_story"]
         del st.session_state["story_params"]
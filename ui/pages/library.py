@@ -7,8 +7,10 @@ import streamlit as st
 
 from db.models import Story
 from db.session import SessionLocal
-from storage.file_store import read_file_bytes
-from config import STORAGE_DIR
+from storage.file_store import read_file_bytes, read_published_audio
+from config import EMOTIONS, STORAGE_DIR
+from story.schema import StructuredStory
+from workers.story_worker import get_segments_dir, submit_rerender_job
 from i18n import t
 
 
@@ -36,6 +38,41 @@ def _download_link(audio_bytes: bytes, filename: str, label: str):
     st.markdown(href, unsafe_allow_html=True)
 
 
+def _plays_ogg_opus() -> bool:
+    """Whether the client's browser can play Ogg Opus.
+
+    Safari (and every iOS browser, which all run on WebKit) only plays Ogg
+    Opus from Safari 18.4 on, so WebKit clients that are not Chromium are
+    served the MP3 master instead.
+    """
+    user_agent = st.context.headers.get("User-Agent", "")
+    if "AppleWebKit" not in user_agent:
+        return True
+    return "Chrome/" in user_agent or "Firefox/" in user_agent
+
+
+def _playback_audio(story: Story) -> tuple[bytes | None, str]:
+    """Bytes and MIME type of the smallest rendition the client can play, for the in-page player."""
+    renditions = sorted(
+        (story.audio_renditions or {}).values(), key=lambda entry: entry.get("bytes", 0),
+    )
+    if not _plays_ogg_opus():
+        renditions = [entry for entry in renditions if entry["mime"] != "audio/ogg"]
+    for entry in renditions:
+        audio_bytes = read_file_bytes(entry["path"])
+        if audio_bytes:
+            return audio_bytes, entry["mime"]
+    return read_file_bytes(story.audio_path), "audio/mp3"
+
+
+def _render_progressive(story: Story):
+    """Play the part of a new story published so far while the rest is still rendering."""
+    published = read_published_audio(story.id)
+    if published:
+        st.audio(published, format="audio/mpeg")
+        st.caption(t("library.progressive_hint"))
+
+
 def show_library_page():
     st.markdown(f"## {t('library.header')}")
 
@@ -89,7 +126,8 @@ def _handle_delete(db):
         Story.user_id == st.session_state["user_id"],
     ).first()
     if story:
-        for path in (story.audio_path, story.cover_image_path):
+        rendition_paths = [entry["path"] for entry in (story.audio_renditions or {}).values()]
+        for path in {story.audio_path, story.cover_image_path, *rendition_paths}:
             if path and os.path.exists(path):
                 try:
                     os.remove(path)
@@ -100,6 +138,8 @@ def _handle_delete(db):
             rec_dir = os.path.join(STORAGE_DIR, "recordings", story.id)
             if os.path.isdir(rec_dir):
                 shutil.rmtree(rec_dir, ignore_errors=True)
+        # Clean up per-segment audio stems
+        shutil.rmtree(get_segments_dir(story.id), ignore_errors=True)
         db.delete(story)
         db.commit()
         st.success(t("library.deleted", title=story.title))
@@ -131,6 +171,47 @@ def _delete_button(story: Story):
             st.rerun()
 
 
+def _rerender_editor(story: Story, db):
+    """Let the user edit segment text/emotion and re-render only what changed."""
+    if not story.story_json:
+        return
+    structured = StructuredStory.model_validate(story.story_json)
+
+    with st.expander(t("library.edit_story"), expanded=False):
+        st.caption(t("library.edit_hint"))
+        changed = False
+        for seg in structured.segments:
+            label = seg.character or t("create.seg_narration")
+            col_text, col_emotion = st.columns([3, 1])
+            with col_text:
+                new_text = st.text_area(
+                    f"{label} #{seg.segment_id}", value=seg.text,
+                    key=f"edit_{story.id}_{seg.segment_id}", height=80,
+                )
+            with col_emotion:
+                new_emotion = st.selectbox(
+                    t("library.emotion"), EMOTIONS,
+                    index=EMOTIONS.index(seg.emotion) if seg.emotion in EMOTIONS else 0,
+                    key=f"emo_{story.id}_{seg.segment_id}",
+                )
+            if new_text.strip() and new_text.strip() != seg.text:
+                seg.text = new_text.strip()
+                changed = True
+            if new_emotion != seg.emotion:
+                seg.emotion = new_emotion
+                changed = True
+
+        if st.button(t("library.btn_rerender"), key=f"rerender_{story.id}"):
+            if not changed:
+                st.info(t("library.rerender_no_changes"))
+                return
+            story.status = "tts_processing"
+            db.commit()
+            submit_rerender_job(story.id, structured)
+            st.success(t("library.rerender_started"))
+            st.rerun()
+
+
 # ── List view ──────────────────────────────────────────────
 
 def _render_story_card(story: Story, db):
@@ -172,21 +253,30 @@ def _render_story_card(story: Story, db):
             if story.summary:
                 st.caption(story.summary)
 
-            if story.status == "ready" and story.audio_path:
-                audio_bytes = read_file_bytes(story.audio_path)
-                if audio_bytes:
+            # A re-render keeps the previous audio playable until it is replaced
+            if story.status in ("ready", "tts_processing") and story.audio_path:
+                playback_bytes, playback_mime = _playback_audio(story)
+                if playback_bytes:
                     st.markdown(
                         f'<span class="ai-badge">{t("library.ai_audio")}</span>',
                         unsafe_allow_html=True,
                     )
-                    st.audio(audio_bytes, format="audio/mp3")
+                    st.audio(playback_bytes, format=playback_mime)
 
                     if story.duration_seconds:
                         minutes = int(story.duration_seconds // 60)
                         seconds = int(story.duration_seconds % 60)
                         st.caption(t("library.duration", duration=f"{minutes}:{seconds:02d}"))
 
-                    _download_link(audio_bytes, _safe_filename(story.title), t("library.download_mp3"))
+                    audio_bytes = read_file_bytes(story.audio_path)
+                    if audio_bytes:
+                        _download_link(audio_bytes, _safe_filename(story.title), t("library.download_mp3"))
+
+                if story.status == "ready":
+                    _rerender_editor(story, db)
+
+            elif story.status == "tts_processing":
+                _render_progressive(story)
 
             elif story.status == "failed":
                 st.error(t("library.audio_failed"))
@@ -233,15 +323,19 @@ def _render_tile(story: Story):
         )
         st.caption(f"{story.mood or ''} | {story.age_range or ''}")
 
-        if story.status == "ready" and story.audio_path:
-            audio_bytes = read_file_bytes(story.audio_path)
-            if audio_bytes:
+        if story.status in ("ready", "tts_processing") and story.audio_path:
+            playback_bytes, playback_mime = _playback_audio(story)
+            if playback_bytes:
                 st.markdown(
                     f'<span class="ai-badge" style="font-size:0.65rem;">{t("library.ai_audio")}</span>',
                     unsafe_allow_html=True,
                 )
-                st.audio(audio_bytes, format="audio/mp3")
-                _download_link(audio_bytes, _safe_filename(story.title), t("library.download"))
+                st.audio(playback_bytes, format=playback_mime)
+                audio_bytes = read_file_bytes(story.audio_path)
+                if audio_bytes:
+                    _download_link(audio_bytes, _safe_filename(story.title), t("library.download"))
+        elif story.status == "tts_processing":
+            _render_progressive(story)
 
         _delete_button(story)
         st.divider()
@@ -0,0 +1,229 @@
+"""Speculative TTS for story drafts while the user is still reviewing the preview.
+
+Each user's draft gets a session that synthesizes segments in the background
+into its own directory under STORAGE_DIR/spool. Every preview rerun calls update()
+with the current (possibly edited) draft: segments whose fingerprint is
+unchanged keep their job, edited ones are invalidated and restarted. On save,
+take() moves the finished segments into the new story's stems directory and
+returns them in the shape synthesize_story(reuse=...) expects; on discard,
+cancel() drops the session.
+
+Characters synthesized by jobs whose audio is never used (edited away, or
+still running when the draft is saved or discarded) are billed to the
+saved story while its session is open, and logged after that.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from config import SPECULATIVE_TTS_WORKERS, STORAGE_DIR
+from story.schema import Segment, StructuredStory
+from tts.pipeline import resolve_voice, segment_fingerprint, synthesize_segment
+from workers.story_worker import get_segments_dir
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_TTS_WORKERS)
+
+# Sessions untouched for this long are cancelled (user left without saving)
+_SESSION_TTL_S = 3600
+
+
+@dataclass
+class _Job:
+    fingerprint: str
+    future: Future
+
+
+@dataclass
+class _Session:
+    user_id: str
+    spool_dir: str
+    jobs: dict[int, _Job] = field(default_factory=dict)
+    touched: float = field(default_factory=time.monotonic)
+    # Characters of discarded jobs, billed to the story the draft becomes
+    wasted_chars: int = 0
+
+
+_sessions: dict[str, _Session] = {}
+# Reentrant: a job discarded after it finished is accounted for immediately
+_lock = threading.RLock()
+
+
+def update(
+    user_id: str,
+    draft: StructuredStory,
+    language: str,
+    tts_model: str | None,
+    skip_segment_ids: set[int] | None = None,
+):
+    """Start or refresh background synthesis for a user's current draft.
+
+    Args:
+        user_id: Owner of the draft (one session per user).
+        draft: The draft with the user's current edits applied.
+        language: Story language for voice selection.
+        tts_model: TTS model the worker will use on save.
+        skip_segment_ids: Segments not worth synthesizing (e.g. the user
+            recorded their own voice for them).
+    """
+    skip_segment_ids = skip_segment_ids or set()
+    char_map = {ch.name: ch for ch in draft.characters}
+
+    with _lock:
+        _expire_stale()
+        session = _sessions.get(user_id)
+        if session is None:
+            spool_dir = os.path.join(STORAGE_DIR, "spool", f"draft_{user_id}_{uuid.uuid4().hex[:8]}")
+            session = _Session(user_id=user_id, spool_dir=spool_dir)
+            os.makedirs(session.spool_dir, exist_ok=True)
+            _sessions[user_id] = session
+        session.touched = time.monotonic()
+
+        wanted = set()
+        for segment in draft.segments:
+            if segment.segment_id in skip_segment_ids:
+                continue
+            wanted.add(segment.segment_id)
+            voice_key = resolve_voice(segment, char_map, language)
+            fingerprint = segment_fingerprint(segment.text, voice_key, tts_model)
+            job = session.jobs.get(segment.segment_id)
+            if job and job.fingerprint == fingerprint:
+                continue
+            if job:
+                _discard(session, job)
+                logger.info("Speculative TTS: segment %d edited, restarting", segment.segment_id)
+            future = _executor.submit(
+                _synthesize, session, segment.model_copy(), voice_key, tts_model, fingerprint,
+            )
+            session.jobs[segment.segment_id] = _Job(fingerprint, future)
+
+        for segment_id in set(session.jobs) - wanted:
+            _discard(session, session.jobs.pop(segment_id))
+
+
+def take(user_id: str, story_id: str) -> tuple[dict[int, dict], int]:
+    """Hand a user's finished speculative segments over to a saved story.
+
+    Finished audio is moved into the story's stems directory; jobs still
+    pending are cancelled and any still running are discarded.
+
+    Returns:
+        (reuse, billed_chars) — reuse maps segment_id → result dict for
+        synthesize_story(reuse=...); billed_chars is what those segments
+        cost plus the characters of the draft's discarded jobs.
+    """
+    with _lock:
+        session = _sessions.pop(user_id, None)
+    if session is None:
+        return {}, 0
+    billed = session.wasted_chars
+
+    stems_dir = get_segments_dir(story_id)
+    os.makedirs(stems_dir, exist_ok=True)
+    reuse = {}
+    for segment_id, job in session.jobs.items():
+        if not job.future.done() or job.future.cancelled() or job.future.exception():
+            _discard(session, job)
+            continue
+        result, chars = job.future.result()
+        if not result["audio_path"]:
+            billed += chars
+            continue
+        stem_path = os.path.join(stems_dir, os.path.basename(result["audio_path"]))
+        os.replace(result["audio_path"], stem_path)
+        reuse[segment_id] = {**result, "audio_path": stem_path}
+        billed += chars
+
+    _close(session)
+    logger.info(
+        "Speculative TTS: handed %d/%d segments to story %s",
+        len(reuse), len(session.jobs), story_id,
+    )
+    return reuse, billed
+
+
+def cancel(user_id: str):
+    """Drop a user's speculative session (draft discarded)."""
+    with _lock:
+        session = _sessions.pop(user_id, None)
+    if session is not None:
+        for job in session.jobs.values():
+            _discard(session, job)
+        _close(session)
+        logger.info("Speculative TTS: cancelled session for user %s", user_id)
+
+
+def _synthesize(
+    session: _Session,
+    segment: Segment,
+    voice_key: tuple[str, str],
+    tts_model: str | None,
+    fingerprint: str,
+) -> tuple[dict, int]:
+    # One directory per fingerprint so a stale job still running can never
+    # overwrite the audio of the edit that replaced it
+    job_dir = os.path.join(session.spool_dir, fingerprint[:16])
+    os.makedirs(job_dir, exist_ok=True)
+    return synthesize_segment(segment, voice_key, tts_model, job_dir)
+
+
+def _discard(session: _Session, job: _Job):
+    """Cancel a job whose audio will not be used, accounting for it if it ran."""
+    if not job.future.cancel():
+        job.future.add_done_callback(lambda future: _record_waste(session, future))
+
+
+def _record_waste(session: _Session, future: Future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    _, chars = future.result()
+    if not chars:
+        return
+    with _lock:
+        if _sessions.get(session.user_id) is session:
+            session.wasted_chars += chars
+            return
+    logger.info(
+        "Speculative TTS: %d characters synthesized for a discarded draft of user %s",
+        chars, session.user_id,
+    )
+
+
+def _close(session: _Session):
+    """Cancel outstanding jobs and remove the spool once nothing writes to it."""
+    pending = [job.future for job in session.jobs.values() if not job.future.cancel()]
+    pending = [future for future in pending if not future.done()]
+    if not pending:
+        shutil.rmtree(session.spool_dir, ignore_errors=True)
+        return
+
+    remaining = [len(pending)]
+    remaining_lock = threading.Lock()
+
+    def _on_done(_future):
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        shutil.rmtree(session.spool_dir, ignore_errors=True)
+
+    for future in pending:
+        future.add_done_callback(_on_done)
+
+
+def _expire_stale():
+    """Cancel sessions nobody has touched for _SESSION_TTL_S (caller holds _lock)."""
+    now = time.monotonic()
+    for user_id in [uid for uid, s in _sessions.items() if now - s.touched > _SESSION_TTL_S]:
+        session = _sessions.pop(user_id)
+        for job in session.jobs.values():
+            _discard(session, job)
+        _close(session)
+        logger.info("Speculative TTS: expired idle session for user %s", user_id)
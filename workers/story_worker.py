@@ -1,28 +1,154 @@
 import logging
 import os
+import shutil
 from concurrent.futures import ThreadPoolExecutor
 
-from config import STORAGE_DIR
+from config import (
+    AUDIO_PROGRESSIVE_CHUNK_S,
+    STORAGE_DIR,
+    TTS_COALESCE_MAX_CHARS,
+    TTS_SPLIT_MAX_CHARS,
+)
 from db.session import SessionLocal
 from db.models import Story
+from storage.file_store import get_progressive_dir
 from story.schema import StructuredStory
 from tts.pipeline import synthesize_story
-from audio.assembler import assemble_audio
+from audio.assembler import ProgressivePublisher, assemble_audio, splice_segments
+from audio.encoder import RENDITIONS, transcode_renditions
 
 logger = logging.getLogger(__name__)
 
 _executor = ThreadPoolExecutor(max_workers=1)
+# BGM for a story is fetched here while its segments are synthesized
+_bgm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="story-bgm")
 
 
-def submit_tts_job(story_id: str, structured_story: StructuredStory):
-    """Submit a TTS generation job to the background executor."""
-    _executor.submit(_process_tts, story_id, structured_story)
+def submit_tts_job(
+    story_id: str,
+    structured_story: StructuredStory,
+    reuse: dict[int, dict] | None = None,
+    prefetched_chars: int = 0,
+):
+    """Submit a TTS generation job to the background executor.
+
+    Args:
+        reuse: Already synthesized segments (e.g. from speculative TTS during
+            the preview), as accepted by synthesize_story(reuse=...).
+        prefetched_chars: TTS characters billed for producing `reuse`, added
+            to the story's cost.
+    """
+    _executor.submit(
+        _process_tts, story_id, structured_story,
+        reuse=reuse, prefetched_chars=prefetched_chars,
+    )
     logger.info("Submitted TTS job for story %s", story_id)
 
 
-def _process_tts(story_id: str, structured_story: StructuredStory):
-    """Background task: synthesize TTS segments and assemble MP3."""
+def submit_rerender_job(story_id: str, structured_story: StructuredStory):
+    """Re-render an existing story after edits, re-synthesizing only changed segments.
+
+    The story keeps its current audio (and stays playable) until the new
+    render is ready; the stored story_json is replaced on success.
+    """
+    _executor.submit(_process_tts, story_id, structured_story, True)
+    logger.info("Submitted re-render job for story %s", story_id)
+
+
+def get_segments_dir(story_id: str) -> str:
+    """Directory holding a story's per-segment audio stems."""
+    return os.path.join(STORAGE_DIR, "segments", story_id)
+
+
+def _persist_stems(story_id: str, segments: list[dict], spool_dir: str) -> dict:
+    """Move freshly synthesized segment audio from the spool into the story's stems dir.
+
+    Updates each result's audio_path in place and returns the segment manifest
+    stored on the story: {segment_id: {"audio_path", "format", "fingerprint", "model"}}.
+    User recordings and failed segments are not part of the manifest.
+    """
+    stems_dir = get_segments_dir(story_id)
+    os.makedirs(stems_dir, exist_ok=True)
+    spool_prefix = os.path.join(spool_dir, "")
+
+    manifest = {}
+    for seg in segments:
+        path = seg.get("audio_path")
+        if not path or not seg.get("fingerprint"):
+            continue
+        if path.startswith(spool_prefix):
+            stem_path = os.path.join(stems_dir, os.path.basename(path))
+            os.replace(path, stem_path)
+            seg["audio_path"] = path = stem_path
+        manifest[str(seg["segment_id"])] = {
+            "audio_path": path,
+            "format": seg["format"],
+            "fingerprint": seg["fingerprint"],
+            "model": seg.get("model"),
+        }
+
+    # Drop stems of segments that were edited away or changed format
+    kept = {entry["audio_path"] for entry in manifest.values()}
+    for name in os.listdir(stems_dir):
+        path = os.path.join(stems_dir, name)
+        if path not in kept:
+            os.remove(path)
+    return manifest
+
+
+def _chapter_title(segment) -> str:
+    """ID3 chapter title for a segment: its speaker and opening words."""
+    words = " ".join(segment.text.split()[:8])
+    if len(words) < len(segment.text.strip()):
+        words += "…"
+    return f"{segment.character}: {words}" if segment.character else words
+
+
+def _changed_segments(
+    story: Story, structured_story: StructuredStory, segments: list[dict], old_manifest: dict,
+) -> list[int] | None:
+    """Ids of the segments a re-render changed, or None if the audio cannot be spliced.
+
+    Splicing needs the previous index to list the same segments in the same
+    order. A segment is unchanged when its audio has the fingerprint of its
+    previous stem and it keeps its pause; recordings, which have no stem,
+    are always spliced again.
+    """
+    index = story.segment_index or {}
+    if list(index.get("segments", {})) != [str(seg["segment_id"]) for seg in segments]:
+        return None
+    old_pauses = {
+        seg.get("segment_id"): seg.get("pause_after_ms", 400)
+        for seg in (story.story_json or {}).get("segments", [])
+    }
+    changed = []
+    for seg, segment in zip(segments, structured_story.segments):
+        previous = old_manifest.get(str(seg["segment_id"]))
+        if (
+            not previous
+            or previous["fingerprint"] != seg.get("fingerprint")
+            or previous["format"] != seg.get("format")
+            or old_pauses.get(segment.segment_id) != segment.pause_after_ms
+        ):
+            changed.append(seg["segment_id"])
+    return changed
+
+
+def _process_tts(
+    story_id: str,
+    structured_story: StructuredStory,
+    rerender: bool = False,
+    reuse: dict[int, dict] | None = None,
+    prefetched_chars: int = 0,
+):
+    """Background task: synthesize TTS segments and assemble MP3.
+
+    With rerender=True, segments whose text, voice and emotion are unchanged
+    since the last render reuse their stored audio, the existing BGM track is
+    kept, and the new TTS cost is added to the story's running totals.
+    """
     db = SessionLocal()
+    spool_dir = work_path = rendition_paths = publisher = None
     try:
         story = db.query(Story).filter(Story.id == story_id).first()
         if not story:
@@ -34,66 +160,151 @@ def _process_tts(story_id: str, structured_story: StructuredStory):
         os.makedirs(audio_dir, exist_ok=True)
 
         output_path = os.path.join(audio_dir, f"{story_id}.mp3")
+        # Built under a temporary name so a re-render never clobbers playable audio
+        work_path = os.path.join(audio_dir, f"{story_id}_work.mp3")
+        rendition_paths = {
+            name: (
+                os.path.join(audio_dir, f"{story_id}_work.{rendition.extension}"),
+                os.path.join(audio_dir, f"{story_id}.{rendition.extension}"),
+            )
+            for name, rendition in RENDITIONS.items()
+        }
+        # Per-story spool: segments are streamed here and moved to the stems dir
+        spool_dir = os.path.join(STORAGE_DIR, "spool", story_id)
 
-        # Synthesize all segments (skip TTS for user-recorded segments)
-        logger.info("Starting TTS synthesis for story %s", story_id)
         from db.settings import get_settings
         settings = get_settings(db)
+
+        # BGM depends only on the mood, so it is fetched in parallel with TTS;
+        # a re-render keeps the story's existing track
+        bgm_path = None
+        bgm_future = None
+        if rerender and story.bgm_path and os.path.exists(story.bgm_path):
+            bgm_path = story.bgm_path
+        elif settings.bgm_enabled and settings.bgm_provider == "lyria2":
+            from audio.bgm_library import pick_loop
+            bgm_future = _bgm_executor.submit(pick_loop, story.mood or "calming", story_id)
+
+        # Synthesize all segments (skip TTS for user-recorded segments)
+        logger.info("Starting TTS synthesis for story %s (rerender=%s)", story_id, rerender)
         recordings = story.user_recordings or {}
         # Keys come from JSON as strings; convert to int for segment_id lookup
         recordings = {int(k): v for k, v in recordings.items()} if recordings else {}
+        reuse = dict(reuse or {})
+        if rerender and story.segment_manifest:
+            reuse = {int(k): v for k, v in story.segment_manifest.items()}
+        # A new story publishes its finished prefix for early playback; a
+        # re-render keeps its previous audio playable instead
+        if AUDIO_PROGRESSIVE_CHUNK_S > 0 and not rerender:
+            publisher = ProgressivePublisher(
+                os.path.join(get_progressive_dir(story_id), "index.m3u8"), AUDIO_PROGRESSIVE_CHUNK_S,
+            )
         segments, total_tts_chars = synthesize_story(
             structured_story,
             tts_model=settings.tts_model,
             recordings=recordings,
             language=story.language or "en",
+            max_workers=settings.tts_concurrency or 1,
+            spool_dir=spool_dir,
+            coalesce_max_chars=TTS_COALESCE_MAX_CHARS if settings.tts_coalesce else 0,
+            reuse=reuse,
+            adaptive=bool(settings.tts_adaptive_concurrency),
+            split_max_chars=TTS_SPLIT_MAX_CHARS,
+            fallback_model=None if settings.tts_fallback_model == "none" else settings.tts_fallback_model,
+            on_result=publisher.add if publisher else None,
         )
-
-        # Assemble into MP3 with ID3 tags for player compatibility
-        audio_tags = {
-            "title": story.title or "StoryX Story",
-            "artist": "StoryX",
-            "album": "StoryX Stories",
-            "genre": "Children",
-        }
-        duration = assemble_audio(segments, output_path, tags=audio_tags)
+        if publisher:
+            publisher.close()
+        total_tts_chars += prefetched_chars
+        titles = {segment.segment_id: _chapter_title(segment) for segment in structured_story.segments}
+        for seg in segments:
+            seg["title"] = titles.get(seg["segment_id"])
 
         # Record TTS cost data
-        from credits.cost_tracker import estimate_tts_cost
-        cost_tts = estimate_tts_cost(total_tts_chars, model=settings.tts_model)
+        from credits.cost_tracker import estimate_segments_tts_cost, estimate_tts_cost
+        # Priced per segment: routing may have sent some to the fallback model
+        cost_tts = estimate_segments_tts_cost(segments, default_model=settings.tts_model)
+        cost_tts += estimate_tts_cost(prefetched_chars, model=settings.tts_model)
+        if rerender:
+            total_tts_chars += story.total_tts_chars or 0
+            cost_tts += story.cost_tts or 0
         story.total_tts_chars = total_tts_chars
         story.cost_tts = round(cost_tts, 6)
 
-        # BGM generation (if enabled)
-        cost_bgm = 0.0
-        if settings.bgm_enabled and settings.bgm_provider == "lyria2":
-            from audio.bgm import generate_bgm, mix_bgm
-            logger.info("Generating BGM for story %s", story_id)
-            bgm_path = generate_bgm(
-                mood=story.mood or "calming",
-                duration_seconds=duration,
-                story_id=story_id,
-            )
+        # Join the BGM started with the job
+        cost_bgm = (story.cost_bgm or 0.0) if rerender else 0.0
+        if bgm_future is not None:
+            try:
+                bgm_path, generated_now = bgm_future.result()
+            except Exception as e:
+                logger.error("BGM selection failed for story %s: %s", story_id, e)
+                bgm_path, generated_now = None, False
             if bgm_path:
                 story.bgm_path = bgm_path
-                mixed_path = os.path.join(audio_dir, f"{story_id}_mixed.mp3")
-                duration = mix_bgm(output_path, bgm_path, mixed_path, tags=audio_tags)
-                # Replace the narration-only file with the mixed version
-                os.replace(mixed_path, output_path)
+            # Loops from the library were paid for when they were generated
+            if generated_now:
                 from credits.pricing import COST_LYRIA2_PER_GENERATION
                 cost_bgm = COST_LYRIA2_PER_GENERATION
-                logger.info("BGM mixed for story %s", story_id)
+
+        # Assemble into MP3 with ID3 tags for player compatibility;
+        # narration and BGM are mixed in memory and encoded once
+        audio_tags = {
+            "title": story.title or "StoryX Story",
+            "artist": "StoryX",
+            "album": "StoryX Stories",
+            "genre": "Children",
+        }
+        work_renditions = {name: work for name, (work, _) in rendition_paths.items()}
+        index = dict(story.segment_index or {})
+        duration = None
+        # Without a BGM bed, a re-render re-encodes only the frames around
+        # the changed segments of the previous MP3
+        changed = None
+        if rerender and not bgm_path and story.audio_path and os.path.exists(story.audio_path):
+            changed = _changed_segments(story, structured_story, segments, story.segment_manifest or {})
+        if changed is not None:
+            shutil.copyfile(story.audio_path, work_path)
+            by_id = {seg["segment_id"]: seg for seg in segments}
+            duration = splice_segments(
+                work_path, index, {segment_id: by_id[segment_id] for segment_id in changed}, audio_tags,
+            )
+            if duration is not None:
+                transcode_renditions(work_path, work_renditions, audio_tags)
+                logger.info("Spliced %d changed segments into story %s", len(changed), story_id)
+        if duration is None:
+            index = {}
+            duration = assemble_audio(
+                segments, work_path, tags=audio_tags, bgm_path=bgm_path,
+                renditions=work_renditions, index=index,
+            )
+
+        os.replace(work_path, output_path)
+        renditions = {"mp3": {"path": output_path, "mime": "audio/mpeg"}}
+        for name, (work, final) in rendition_paths.items():
+            os.replace(work, final)
+            renditions[name] = {"path": final, "mime": RENDITIONS[name].mime}
+        for entry in renditions.values():
+            entry["bytes"] = os.path.getsize(entry["path"])
+        # Only now that the new audio is in place: this overwrites and prunes
+        # the stems the previous manifest, index and master were built from
+        manifest = _persist_stems(story_id, segments, spool_dir)
 
         story.cost_bgm = round(cost_bgm, 6)
         story.cost_total = round(
             (story.cost_story_generation or 0)
             + (story.cost_cover_image or 0)
-            + cost_tts
+            + story.cost_tts
             + cost_bgm, 6
         )
 
         # Update story record
+        if rerender:
+            story.story_json = structured_story.model_dump()
+            story.segment_count = len(structured_story.segments)
+        story.segment_manifest = manifest
         story.audio_path = output_path
+        story.audio_renditions = renditions
+        story.segment_index = index
         story.duration_seconds = duration
         story.status = "ready"
         db.commit()
@@ -104,9 +315,20 @@ def _process_tts(story_id: str, structured_story: StructuredStory):
         try:
             story = db.query(Story).filter(Story.id == story_id).first()
             if story:
-                story.status = "failed"
+                # A failed re-render leaves the previous audio in place
+                keep_previous = rerender and story.audio_path and os.path.exists(story.audio_path)
+                story.status = "ready" if keep_previous else "failed"
                 db.commit()
         except Exception:
             db.rollback()
     finally:
+        if spool_dir:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        if publisher:
+            # The full audio (or the failure) supersedes the preview
+            publisher.abort()
+            shutil.rmtree(get_progressive_dir(story_id), ignore_errors=True)
+        for path in [work_path] + [work for work, _ in (rendition_paths or {}).values()]:
+            if path and os.path.exists(path):
+                os.remove(path)
         db.close()
@@ -0,0 +1,148 @@
+"""Voice effects applied to recordings in the background while a draft is reviewed.
+
+The preview page calls submit() on every rerun for each recording and the
+effect chosen for it. Work is keyed by the recording's content hash and the
+preset, runs on a process pool shared by every session so effect processing
+never competes with script runs for the server's GIL, and lands in a
+content-addressed cache under STORAGE_DIR/spool/voice_fx. On save, result()
+returns the processed file, waiting only if the job is still running.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import STORAGE_DIR, VOICE_EFFECT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(STORAGE_DIR, "spool", "voice_fx")
+
+# Processed files untouched for this long are removed (draft abandoned)
+_CACHE_TTL_S = 24 * 3600
+_PRUNE_INTERVAL_S = 600
+
+_executor: ProcessPoolExecutor | None = None
+_jobs: dict[str, Future] = {}
+# Reentrant: a done callback added to a job that already finished runs at once
+_lock = threading.RLock()
+_last_prune = 0.0
+
+
+def submit(audio_bytes: bytes, effect: str) -> str:
+    """Start processing a recording with an effect unless already done or running.
+
+    Returns the path the processed WAV is (or will be) written to.
+    """
+    return _submit(audio_bytes, effect)[0]
+
+
+def result(audio_bytes: bytes, effect: str, timeout: float | None = None) -> str:
+    """Return the processed recording's path, submitting or waiting for it as needed.
+
+    Raises whatever apply_effect raised in the worker process.
+    """
+    path, future = _submit(audio_bytes, effect)
+    if future is not None:
+        # Held here, so a failure is seen even once the job has been forgotten
+        future.result(timeout=timeout)
+    return path
+
+
+def _submit(audio_bytes: bytes, effect: str) -> tuple[str, Future | None]:
+    """The cache path and the job writing it, None when the file is already there."""
+    effect = (effect or "clean").lower().strip()
+    path = _cache_path(audio_bytes, effect)
+    with _lock:
+        _prune()
+        if path in _jobs:
+            return path, _jobs[path]
+        if os.path.exists(path):
+            # Keep files in use from being pruned
+            os.utime(path)
+            return path, None
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        if effect == "clean":
+            _write(path, audio_bytes)
+            return path, None
+        try:
+            future = _pool().submit(_process, audio_bytes, effect, path)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool once
+            logger.warning("Voice effect pool is broken, restarting it")
+            _reset_pool()
+            future = _pool().submit(_process, audio_bytes, effect, path)
+        _jobs[path] = future
+        future.add_done_callback(lambda done, key=path: _forget(key, done))
+    return path, future
+
+
+def _cache_path(audio_bytes: bytes, effect: str) -> str:
+    digest = hashlib.sha256(audio_bytes).hexdigest()[:32]
+    return os.path.join(CACHE_DIR, f"{digest}_{effect}.wav")
+
+
+def _pool() -> ProcessPoolExecutor:
+    """Create the shared pool on first use (caller holds _lock).
+
+    Workers are spawned rather than forked: the Streamlit server is
+    multi-threaded and a forked child could inherit a held lock.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=VOICE_EFFECT_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _reset_pool():
+    """Drop a broken pool so the next _pool() call starts a new one (caller holds _lock)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _process(audio_bytes: bytes, effect: str, path: str) -> str:
+    """Worker process entry point: apply the effect and publish the file atomically."""
+    from audio.effects import apply_effect
+
+    _write(path, apply_effect(audio_bytes, effect))
+    return path
+
+
+def _write(path: str, data: bytes):
+    part_path = f"{path}.{os.getpid()}.part"
+    with open(part_path, "wb") as f:
+        f.write(data)
+    os.replace(part_path, path)
+
+
+def _forget(path: str, future: Future):
+    with _lock:
+        if _jobs.get(path) is future:
+            del _jobs[path]
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Voice effect failed for %s: %s", os.path.basename(path), future.exception())
+
+
+def _prune():
+    """Remove stale cache files, at most every _PRUNE_INTERVAL_S (caller holds _lock)."""
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < _PRUNE_INTERVAL_S or not os.path.isdir(CACHE_DIR):
+        return
+    _last_prune = now
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            if path not in _jobs and now - os.path.getmtime(path) > _CACHE_TTL_S:
+                os.remove(path)
+        except OSError:
+            pass